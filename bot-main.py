@@ -1,23 +1,17 @@
 import os
+import secrets
+import asyncio
 import logging
-from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 
-# Configuração de Timezone
-try:
-    from zoneinfo import ZoneInfo
-    BRASILIA_TZ = ZoneInfo("America/Sao_Paulo")
-except ImportError:
-    from datetime import timezone, timedelta
-    BRASILIA_TZ = timezone(timedelta(hours=-3))
-
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
+from telegram.constants import ParseMode
+from telegram.ext import AIORateLimiter, Application, CommandHandler, CallbackQueryHandler, MessageHandler, Defaults, filters, ContextTypes
 from telegram.error import Conflict
 
 # Módulos Internos
-from db import prisma
-from modules.utils import require_admin, is_super_admin
+from db import prisma, ativar_wal
+from modules.utils import precarregar_admins, ack_antecipado, avisar, confirmar_callback, require_admin, descartar_cliques_repetidos, serialize_per_user, is_super_admin, callback_com_id, nova_sessao_edicao, BOTAO_VOLTAR_INICIO
 from modules.ui import mostrar_menu_inicial_msg, mostrar_menu_inicial_query, mostrar_menu_edicao
 from modules.criar_canal import handle_criar_canal_callback, handle_criar_canal_message
 from modules.edit.editar_nome import handle_edit_nome_callback, handle_edit_nome_message
@@ -40,6 +34,10 @@ logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s
 logger = logging.getLogger(__name__)
 
 BOT_TOKEN = os.getenv('BOT_TOKEN')
+# Webhook (opcional): com WEBHOOK_URL definido o Telegram empurra os updates em vez de long polling
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or secrets.token_hex(20)
+WEBHOOK_PORT = int(os.getenv('PORT', 8443))
 SUPER_ADMIN_ID = int(os.getenv('SUPER_ADMIN', 0))
 
 if not BOT_TOKEN:
@@ -49,96 +47,149 @@ parser = MessageParser()
 media_handler = MediaHandler()
 
 @require_admin
+@serialize_per_user
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Menu Inicial"""
     user_id = update.effective_user.id
     # Limpa contexto de fluxos pendentes
-    for key in list(context.user_data.keys()):
-        context.user_data.pop(key, None)
+    context.user_data.clear()
     await mostrar_menu_inicial_msg(update.message, user_id)
 
+async def _rota_editar_canal(query, context):
+    canais = await get_all_canais(user_id=query.from_user.id)
+    if not canais:
+        await query.edit_message_text("📭 Nenhum canal encontrado.\nCrie um primeiro.")
+        return
+    keyboard = [[InlineKeyboardButton(f"📢 {c['nome']}", callback_data=callback_com_id("ec:", c['id']))] for c in canais]
+    keyboard.append([BOTAO_VOLTAR_INICIO])
+    await query.edit_message_text("✏️ <b>Editar Canal</b>\n\nSelecione um canal:", 
+                                 reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def _rota_voltar_start(query, context):
+    await mostrar_menu_inicial_query(query, query.from_user.id)
+
+async def _rota_editar_canal_id(query, context, sufixo):
+    user_id = query.from_user.id
+    canal_id = int(sufixo)
+    canal = await get_canal(canal_id)
+    if not canal or (not is_super_admin(user_id) and canal['user_id'] != user_id):
+        await query.edit_message_text("❌ Sem permissão ou canal inexistente.")
+        return
+    context.user_data['editando'] = nova_sessao_edicao(canal)
+    await mostrar_menu_edicao(query, context)
+
+async def _rota_edit_voltar(query, context):
+    await mostrar_menu_edicao(query, context)
+
+async def _rota_edit_cancelar(query, context):
+    context.user_data.pop('editando', None)
+    await query.edit_message_text("❌ Edição cancelada.")
+
+async def _rota_edit_salvar(query, context):
+    dados = context.user_data.get('editando')
+    if not dados or not dados['changes_made']:
+        await avisar(query, context, "ℹ️ Nenhuma alteração para salvar.")
+        return
+
+    # Daqui em diante não há aviso: o ack sai antes da escrita no banco
+    ack_antecipado(query, context)
+    await update_canal(canal_id=dados['canal_id'], nome=dados['nome'], 
+                      ids_canal=dados['ids'], horarios=dados['horarios'])
+    
+    # Reset flag de mudanças e mostra menu novamente com mensagem de sucesso
+    dados['changes_made'] = False
+    success_msg = "✅ <b>Alterações salvas com sucesso!</b>\n\n"
+    await mostrar_menu_edicao(query, context, extra_text=success_msg)
+
+# Rotas de navegação principal, registradas como CallbackQueryHandlers próprios em main():
+# padrão -> handler(query, context, *grupos capturados)
+_ROTAS_NAVEGACAO = (
+    (r"^editar_canal$", _rota_editar_canal),
+    (r"^voltar_start$", _rota_voltar_start),
+    (r"^edit_voltar$", _rota_edit_voltar),
+    (r"^edit_cancelar$", _rota_edit_cancelar),
+    (r"^edit_salvar$", _rota_edit_salvar),
+    (r"^ec:(\d+)$", _rota_editar_canal_id),
+)
+
+# callback_data (exatos ou prefixos) cujos handlers podem responder com avisar(): estes respondem
+# o callback por conta própria; os demais recebem o ack vazio antes do despacho, em paralelo com o trabalho
+_CALLBACKS_COM_AVISO = (
+    "gerenciar_admins", "adicionar_admin", "remover_admin_", "painel_controle", "ver_canais_admin_",
+    "confirmar_salvar_estatico", "link_choice_keep",
+    "edit_remover_horario",
+    "edit_deletar_canal", "confirmar_deletar_canal_",
+    "confirmar_deletar_grupo_", "preview_grupo_midia_", "associar_template_grupo_",
+    "conf_assoc_temp_", "remover_template_grupo_",
+    "edit_salvar",
+)
+
+def _iniciar_ack(query, context):
+    """Ack antecipado para rotas sem aviso; as com aviso ficam para avisar() ou confirmar_callback()"""
+    if not query.data.startswith(_CALLBACKS_COM_AVISO):
+        ack_antecipado(query, context)
+
+def _callback_de_rota(rota):
+    """Adapta uma rota de navegação para CallbackQueryHandler (auth, lock por usuário e ack)"""
+    @require_admin
+    @descartar_cliques_repetidos
+    @serialize_per_user
+    async def callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        _iniciar_ack(query, context)
+        try:
+            await rota(query, context, *context.match.groups())
+        finally:
+            await confirmar_callback(query, context)
+    return callback
+
 @require_admin
+@descartar_cliques_repetidos
+@serialize_per_user
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Roteador de Callbacks"""
     query = update.callback_query
-    await query.answer()
-    user_id = query.from_user.id
-    data = query.data
-
-    # 1. Delegações de Módulos (Ordem importa)
-    if await handle_criar_canal_callback(query, context): return
-    if await handle_admin_callback(query, context, SUPER_ADMIN_ID): return
-    if await handle_global_button_callback(query, context): return
-    if await handle_edit_template_callback(query, context, parser): return
-    if await handle_edit_media_callback(query, context, media_handler, prisma): return
-    if await handle_edit_nome_callback(query, context): return
-    if await handle_edit_ids_callback(query, context): return
-    if await handle_edit_time_callback(query, context): return
-    if await handle_deletar_canal_callback(query, context): return
-
-    # 2. Navegação Principal em bot-main.py
-    if data == "editar_canal":
-        canais = await get_all_canais(user_id=user_id)
-        if not canais:
-            await query.edit_message_text("📭 Nenhum canal encontrado.\nCrie um primeiro.", parse_mode='HTML')
-            return
-        keyboard = [[InlineKeyboardButton(f"📢 {c['nome']}", callback_data=f"editar_canal_{c['id']}")] for c in canais]
-        keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data="voltar_start")])
-        await query.edit_message_text("✏️ <b>Editar Canal</b>\n\nSelecione um canal:", 
-                                     reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
-    
-    elif data == "voltar_start":
-        await mostrar_menu_inicial_query(query, user_id)
-    
-    elif data.startswith("editar_canal_"):
-        canal_id = int(data.split("_")[-1])
-        canal = await get_canal(canal_id)
-        if not canal or (not is_super_admin(user_id) and canal['user_id'] != user_id):
-            await query.edit_message_text("❌ Sem permissão ou canal inexistente.", parse_mode='HTML')
-            return
-        context.user_data['editando'] = {
-            'canal_id': canal_id, 'nome': canal['nome'], 
-            'ids': canal['ids'].copy(), 'horarios': canal['horarios'].copy(), 
-            'changes_made': False
-        }
-        await mostrar_menu_edicao(query, context)
-
-    elif data == "edit_voltar":
-        await mostrar_menu_edicao(query, context)
-
-    elif data == "edit_cancelar":
-        context.user_data.pop('editando', None)
-        await query.edit_message_text("❌ Edição cancelada.", parse_mode='HTML')
-
-    elif data == "edit_salvar":
-        dados = context.user_data.get('editando')
-        if not dados or not dados.get('changes_made', False):
-            await query.answer("ℹ️ Nenhuma alteração para salvar.")
-            return
-
-        await update_canal(canal_id=dados['canal_id'], nome=dados.get('nome'), 
-                          ids_canal=dados.get('ids'), horarios=dados.get('horarios'))
-        
-        # Reset flag de mudanças e mostra menu novamente com mensagem de sucesso
-        dados['changes_made'] = False
-        success_msg = "✅ <b>Alterações salvas com sucesso!</b>\n\n"
-        await mostrar_menu_edicao(query, context, extra_text=success_msg)
+    # Uma resposta por callback: ack antecipado ou, nas rotas com aviso, avisar()/ack vazio no fim
+    _iniciar_ack(query, context)
+    try:
+        # 1. Delegações de Módulos (Ordem importa)
+        if await handle_criar_canal_callback(query, context): return
+        if await handle_admin_callback(query, context, SUPER_ADMIN_ID): return
+        if await handle_global_button_callback(query, context): return
+        if await handle_edit_template_callback(query, context, parser): return
+        if await handle_edit_media_callback(query, context, media_handler, prisma): return
+        if await handle_edit_nome_callback(query, context): return
+        if await handle_edit_ids_callback(query, context): return
+        if await handle_edit_time_callback(query, context): return
+        if await handle_deletar_canal_callback(query, context): return
+    finally:
+        await confirmar_callback(query, context)
+    # A navegação principal (editar_canal, voltar_start, edit_*, ec:<id>) tem handlers próprios em main()
+
+# Etapa da sessão de edição -> handler que a consome
+_MENSAGEM_POR_ETAPA_EDICAO = {
+    'editando_nome': handle_edit_nome_message,
+    'adicionando_id': handle_edit_ids_message,
+    'adicionando_horario': handle_edit_time_message,
+}
 
 @require_admin
+@serialize_per_user
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Roteador de Mensagens"""
     # Delegações de Módulos (Ordem importa)
     if await handle_admin_message(update, context, SUPER_ADMIN_ID): return
-    if 'editando' in context.user_data:
-        if await handle_edit_nome_message(update, context): return
-        if await handle_edit_ids_message(update, context): return
-        if await handle_edit_time_message(update, context): return
+    dados = context.user_data.get('editando')
+    if dados:
+        handler = _MENSAGEM_POR_ETAPA_EDICAO.get(dados['etapa'])
+        if handler and await handler(update, context): return
     if await handle_criar_canal_message(update, context): return
     if await handle_edit_template_message(update, context, parser): return
     if await handle_edit_media_input(update, context, media_handler): return
     if await handle_global_button_message(update, context): return
 
 @require_admin
+@serialize_per_user
 async def handle_media(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Roteador de Mídias"""
     if await handle_edit_media_input(update, context, media_handler):
@@ -147,9 +198,10 @@ async def handle_media(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # Inicialização e Eventos
 async def post_init(app: Application) -> None:
     await prisma.connect()
+    await ativar_wal()
+    await precarregar_admins()
     await set_bot_commands(app)
     app.bot_data['scheduler'] = MediaScheduler(media_handler, app.bot)
-    import asyncio
     asyncio.create_task(app.bot_data['scheduler'].run_scheduler())
     logger.info("🚀 Scheduler iniciado!")
 
@@ -162,17 +214,38 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return # Silencia conflitos de polling
     logger.error(f"Erro: {context.error}", exc_info=context.error)
 
+# O bot só trata mensagens e cliques em botões; o resto nem é pedido ao Telegram
+_UPDATES_USADOS = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
 def main():
-    app = Application.builder().token(BOT_TOKEN).post_init(post_init).post_shutdown(post_shutdown).build()
+    app = (
+        Application.builder().token(BOT_TOKEN)
+        .defaults(Defaults(parse_mode=ParseMode.HTML))  # Todas as mensagens do bot são HTML salvo parse_mode explícito
+        .http_version("2")  # Edições paralelas multiplexadas numa única conexão keep-alive com a API
+        .rate_limiter(AIORateLimiter(max_retries=2))  # Respeita os limites do Telegram e repete após RetryAfter
+        .concurrent_updates(True)  # Updates de usuários diferentes não esperam uns pelos outros
+        .post_init(post_init).post_shutdown(post_shutdown)
+        .build()
+    )
     app.add_error_handler(error_handler)
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("finalizar_grupo", finalizar_grupo))
+    for padrao, rota in _ROTAS_NAVEGACAO:
+        app.add_handler(CallbackQueryHandler(_callback_de_rota(rota), pattern=padrao))
     app.add_handler(CallbackQueryHandler(handle_callback))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     app.add_handler(MessageHandler(filters.PHOTO | filters.VIDEO, handle_media))
     
     logger.info("Bot Iniciado!")
-    app.run_polling(drop_pending_updates=True)
+    if WEBHOOK_URL:
+        # O secret serve de caminho e de X-Telegram-Bot-Api-Secret-Token: requisições sem ele são recusadas
+        app.run_webhook(
+            listen="0.0.0.0", port=WEBHOOK_PORT, url_path=WEBHOOK_SECRET,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_SECRET}", secret_token=WEBHOOK_SECRET,
+            drop_pending_updates=True, allowed_updates=_UPDATES_USADOS
+        )
+    else:
+        app.run_polling(drop_pending_updates=True, allowed_updates=_UPDATES_USADOS, poll_interval=0, timeout=30)
 
 if __name__ == '__main__':
     main()
@@ -6,6 +6,7 @@ Uso:
 
     # No startup do bot:
     await prisma.connect()
+    await ativar_wal()
 
     # No shutdown:
     await prisma.disconnect()
@@ -14,3 +15,9 @@ Uso:
 from prisma import Prisma
 
 prisma = Prisma()
+
+
+async def ativar_wal() -> None:
+    """Põe o SQLite em modo WAL: leituras do bot não esperam as escritas do scheduler"""
+    # journal_mode fica gravado no arquivo do banco; o PRAGMA devolve uma linha, daí query_raw
+    await prisma.query_raw("PRAGMA journal_mode=WAL")
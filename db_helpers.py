@@ -10,6 +10,7 @@ Uso:
     )
 """
 
+import time
 from typing import Optional, List, Tuple, Dict
 from db import prisma
 
@@ -102,23 +103,27 @@ async def get_all_canais(user_id: Optional[int] = None) -> List[Dict]:
 
 async def delete_canal(canal_id: int) -> bool:
     result = await prisma.canal.delete_many(where={"id": canal_id})
+    _invalidar_template()  # templates do canal são removidos em cascata
+    _invalidar_botoes_globais()  # assim como os botões globais
     return result > 0
 
 async def update_canal(canal_id: int, nome: Optional[str] = None,
                        ids_canal: Optional[List[str]] = None,
                        horarios: Optional[List[str]] = None) -> bool:
-    if nome:
-        await prisma.canal.update(where={"id": canal_id}, data={"nome": nome})
+    # Todas as escritas vão numa única transação/requisição ao engine, em vez de uma por linha
+    async with prisma.batch_() as batcher:
+        if nome:
+            batcher.canal.update(where={"id": canal_id}, data={"nome": nome})
 
-    if ids_canal is not None:
-        await prisma.canalid.delete_many(where={"canal_id": canal_id})
-        for i, tid in enumerate(ids_canal):
-            await prisma.canalid.create(data={"canal_id": canal_id, "telegram_id": str(tid), "ordem": i + 1})
+        if ids_canal is not None:
+            batcher.canalid.delete_many(where={"canal_id": canal_id})
+            for i, tid in enumerate(ids_canal):
+                batcher.canalid.create(data={"canal_id": canal_id, "telegram_id": str(tid), "ordem": i + 1})
 
-    if horarios is not None:
-        await prisma.horario.delete_many(where={"canal_id": canal_id})
-        for i, h in enumerate(horarios):
-            await prisma.horario.create(data={"canal_id": canal_id, "horario": h, "ordem": i + 1})
+        if horarios is not None:
+            batcher.horario.delete_many(where={"canal_id": canal_id})
+            for i, h in enumerate(horarios):
+                batcher.horario.create(data={"canal_id": canal_id, "horario": h, "ordem": i + 1})
 
     return True
 
@@ -127,6 +132,23 @@ async def update_canal(canal_id: int, nome: Optional[str] = None,
 # TEMPLATES
 # ──────────────────────────────────────────────
 
+# Cache do painel de edição (template_id: dict de get_template_with_link_ids)
+_template_cache: Dict[int, Dict] = {}
+_TEMPLATE_CACHE_MAX = 256
+
+# Cache da lista de templates por canal (canal_id: (lista, timestamp))
+_templates_canal_cache: Dict[int, Tuple[List[Dict], float]] = {}
+_TEMPLATES_CANAL_TTL = 30
+
+def _invalidar_template(template_id: Optional[int] = None) -> None:
+    """Descarta o cache de um template, ou de todos quando o id não é conhecido"""
+    # A lista por canal não é indexada por template: qualquer escrita a descarta
+    _templates_canal_cache.clear()
+    if template_id is None:
+        _template_cache.clear()
+    else:
+        _template_cache.pop(template_id, None)
+
 async def save_template(canal_id: int, template_mensagem: str, links: List[Tuple[str, str]]) -> int:
     template = await prisma.template.create(
         data={
@@ -140,6 +162,7 @@ async def save_template(canal_id: int, template_mensagem: str, links: List[Tuple
             }
         }
     )
+    _templates_canal_cache.pop(canal_id, None)
     return template.id
 
 async def get_template(template_id: int) -> Optional[Dict]:
@@ -168,6 +191,11 @@ async def get_template(template_id: int) -> Optional[Dict]:
     }
 
 async def get_templates_by_canal(canal_id: int) -> List[Dict]:
+    now = time.monotonic()
+    cached = _templates_canal_cache.get(canal_id)
+    if cached and now - cached[1] < _TEMPLATES_CANAL_TTL:
+        return cached[0]
+
     templates = await prisma.template.find_many(
         where={"canal_id": canal_id},
         include={
@@ -176,7 +204,7 @@ async def get_templates_by_canal(canal_id: int) -> List[Dict]:
         },
         order={"created_at": "desc"}
     )
-    return [
+    result = [
         {
             "id": t.id, "canal_id": t.canal_id,
             "template_mensagem": t.template_mensagem,
@@ -193,13 +221,20 @@ async def get_templates_by_canal(canal_id: int) -> List[Dict]:
         }
         for t in templates
     ]
+    _templates_canal_cache[canal_id] = (result, now)
+    return result
 
 async def delete_template(template_id: int) -> bool:
     result = await prisma.template.delete_many(where={"id": template_id})
+    _invalidar_template(template_id)
     return result > 0
 
 async def get_template_with_link_ids(template_id: int) -> Optional[Dict]:
     """Retorna template com links como tupla (link_id, segmento, url, ordem) para edição"""
+    cached = _template_cache.get(template_id)
+    if cached is not None:
+        return cached
+
     t = await prisma.template.find_unique(
         where={"id": template_id},
         include={
@@ -209,10 +244,11 @@ async def get_template_with_link_ids(template_id: int) -> Optional[Dict]:
     )
     if not t:
         return None
-    return {
+    template = {
         "id": t.id, "canal_id": t.canal_id,
         "template_mensagem": t.template_mensagem,
-        "links": [(l.id, l.segmento_com_link, l.link_da_mensagem, l.ordem) for l in t.links],
+        # Tupla imutável: o dict fica em cache e é compartilhado entre renders
+        "links": tuple((l.id, l.segmento_com_link, l.link_da_mensagem, l.ordem) for l in t.links),
         "inline_buttons": [
             {
                 "id": b.id, "text": b.button_text, "url": b.button_url, 
@@ -222,17 +258,42 @@ async def get_template_with_link_ids(template_id: int) -> Optional[Dict]:
             for b in t.inline_buttons
         ],
     }
+    if len(_template_cache) >= _TEMPLATE_CACHE_MAX:
+        _template_cache.pop(next(iter(_template_cache)))
+    _template_cache[template_id] = template
+    return template
 
 async def update_link(link_id: int, link_url: str) -> bool:
     result = await prisma.templatelink.update_many(
         where={"id": link_id}, data={"link_da_mensagem": link_url}
     )
+    _invalidar_template()
     return result > 0
 
 async def update_all_links(template_id: int, link_url: str) -> int:
-    return await prisma.templatelink.update_many(
+    result = await prisma.templatelink.update_many(
         where={"template_id": template_id}, data={"link_da_mensagem": link_url}
     )
+    _invalidar_template(template_id)
+    return result
+
+async def update_links_bulk(link_ids: List[int], link_url: str) -> int:
+    """Atualiza vários links para a mesma URL numa única query"""
+    if not link_ids:
+        return 0
+    result = await prisma.templatelink.update_many(
+        where={"id": {"in": link_ids}}, data={"link_da_mensagem": link_url}
+    )
+    _invalidar_template()
+    return result
+
+async def update_canal_links(canal_id: int, link_url: str) -> int:
+    """Atualiza todos os links de todos os templates do canal numa única query"""
+    result = await prisma.templatelink.update_many(
+        where={"template": {"is": {"canal_id": canal_id}}}, data={"link_da_mensagem": link_url}
+    )
+    _invalidar_template()
+    return result
 
 async def get_link_info(link_id: int) -> Optional[Tuple]:
     """Retorna (id, template_id, segmento, url, ordem) ou None"""
@@ -263,6 +324,7 @@ async def save_inline_buttons(template_id: int, buttons: List[Tuple]) -> bool:
                 "button_style": button_style,
             }
         )
+    _invalidar_template(template_id)
     return True
 
 async def get_inline_buttons(template_id: int) -> List[Dict]:
@@ -280,6 +342,7 @@ async def get_inline_buttons(template_id: int) -> List[Dict]:
 
 async def delete_inline_button(button_id: int) -> bool:
     result = await prisma.templateinlinebutton.delete_many(where={"id": button_id})
+    _invalidar_template()
     return result > 0
 
 async def get_inline_button_info(button_id: int) -> Optional[Dict]:
@@ -305,6 +368,7 @@ async def update_inline_button(button_id: int, data: Dict) -> bool:
         where={"id": button_id},
         data=update_data
     )
+    _invalidar_template()
     return result > 0
 
 async def toggle_inline_button_status(button_id: int) -> Optional[str]:
@@ -317,6 +381,7 @@ async def toggle_inline_button_status(button_id: int) -> Optional[str]:
         where={"id": button_id},
         data={"status": new_status}
     )
+    _invalidar_template(b.template_id)
     return new_status
 
 
@@ -324,17 +389,38 @@ async def toggle_inline_button_status(button_id: int) -> Optional[str]:
 # BOTÕES GLOBAIS DO CANAL
 # ──────────────────────────────────────────────
 
+# Cache de get_global_button_info (button_id: dict); toda escrita em botões globais o descarta
+_global_button_cache: Dict[int, Dict] = {}
+_GLOBAL_BUTTON_CACHE_MAX = 512
+
+# Cache da lista de botões globais por canal (canal_id: lista); descartado junto com o de cima
+_global_buttons_canal_cache: Dict[int, List[Dict]] = {}
+
+def _invalidar_botoes_globais(button_id: Optional[int] = None) -> None:
+    """Descarta o cache de um botão global, ou de todos quando o id não é conhecido"""
+    # Escritas por botão não informam o canal: a lista por canal é sempre descartada
+    _global_buttons_canal_cache.clear()
+    if button_id is None:
+        _global_button_cache.clear()
+    else:
+        _global_button_cache.pop(button_id, None)
+
 async def get_global_buttons(canal_id: int) -> List[Dict]:
+    cached = _global_buttons_canal_cache.get(canal_id)
+    if cached is not None:
+        return cached
+
     buttons = await prisma.canalglobalbutton.find_many(
         where={"canal_id": canal_id}, order={"ordem": "asc"}
     )
-    return [
+    lista = _global_buttons_canal_cache[canal_id] = [
         {
             "id": b.id, "text": b.button_text, "url": b.button_url,
             "ordem": b.ordem, "icon_emoji_id": b.icon_emoji_id, "style": b.button_style
         }
         for b in buttons
     ]
+    return lista
 
 async def save_global_buttons(canal_id: int, buttons: List[Tuple]) -> bool:
     """Aceita tuplas (text, url), (text, url, icon_emoji_id) ou (text, url, icon_emoji_id, style)"""
@@ -353,21 +439,32 @@ async def save_global_buttons(canal_id: int, buttons: List[Tuple]) -> bool:
                 "button_style": button_style,
             }
         )
+    # Os botões antigos do canal foram recriados com novos ids
+    _invalidar_botoes_globais()
     return True
 
 async def delete_global_button(button_id: int) -> bool:
     result = await prisma.canalglobalbutton.delete_many(where={"id": button_id})
+    _invalidar_botoes_globais(button_id)
     return result > 0
 
 async def get_global_button_info(button_id: int) -> Optional[Dict]:
+    cached = _global_button_cache.get(button_id)
+    if cached is not None:
+        return cached
+
     b = await prisma.canalglobalbutton.find_unique(where={"id": button_id})
     if not b:
         return None
-    return {
+    info = {
         "id": b.id, "canal_id": b.canal_id, "text": b.button_text,
         "url": b.button_url, "ordem": b.ordem, 
         "icon_emoji_id": b.icon_emoji_id, "style": b.button_style
     }
+    if len(_global_button_cache) >= _GLOBAL_BUTTON_CACHE_MAX:
+        _global_button_cache.pop(next(iter(_global_button_cache)))
+    _global_button_cache[button_id] = info
+    return info
 
 async def update_global_button(button_id: int, data: Dict) -> bool:
     """Atualiza campos de um botão global (text, url, icon_emoji_id, style)"""
@@ -381,6 +478,7 @@ async def update_global_button(button_id: int, data: Dict) -> bool:
         where={"id": button_id},
         data=update_data
     )
+    _invalidar_botoes_globais(button_id)
     return result > 0
 
 
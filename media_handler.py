@@ -8,6 +8,7 @@ from typing import Optional, List, Dict
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto, InputMediaVideo
 from telegram.ext import ContextTypes
 from db import prisma
+from modules.utils import encurtar
 
 logger = logging.getLogger(__name__)
 
@@ -203,9 +204,7 @@ class MediaHandler:
         """Cria teclado inline para listar grupos de mídias"""
         keyboard = []
         for group in groups:
-            display_name = f"📦 {group['nome']} ({group.get('media_count', 0)})"
-            if len(display_name) > 40:
-                display_name = display_name[:37] + "..."
+            display_name = encurtar(f"📦 {group['nome']} ({group.get('media_count', 0)})", 40)
             keyboard.append([InlineKeyboardButton(display_name, callback_data=f"{prefix}_{group['id']}")])
 
         if show_back:
@@ -1,166 +1,165 @@
+import asyncio
 import logging
+from collections import Counter
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import ContextTypes
 from db_helpers import (
     get_all_admins, add_admin, remove_admin, get_admin, get_all_canais
 )
-from modules.utils import is_super_admin
+from modules.utils import is_super_admin, invalidar_cache_admin, get_chat_cached, editar_mensagem, avisar, BOTAO_VOLTAR_INICIO
 
 logger = logging.getLogger(__name__)
 
-async def handle_admin_callback(query, context: ContextTypes.DEFAULT_TYPE, super_admin_id: int):
-    """Handlers de callback para o painel de administração"""
-    data = query.data
-    user_id = query.from_user.id
-    
-    if data == "gerenciar_admins":
-        if not is_super_admin(user_id):
-            await query.answer("❌ Apenas o super admin pode gerenciar admins.", show_alert=True)
-            return True
-        
-        admins = await get_all_admins()
-        
-        mensagem = "👥 <b>Gerenciar Admins</b>\n\n"
-        if not admins:
-            mensagem += "Nenhum admin cadastrado."
-        else:
-            mensagem += "Admins cadastrados:\n\n"
-            for admin in admins:
-                username = admin['username'] or 'Sem username'
-                aid = admin['user_id']
-                mensagem += f"• ID: <code>{aid}</code> - @{username}\n"
-        
-        keyboard = [
-            [InlineKeyboardButton("➕ Adicionar Admin", callback_data="adicionar_admin")],
-            [InlineKeyboardButton("➖ Remover Admin", callback_data="remover_admin_lista")],
-            [InlineKeyboardButton("⬅️ Voltar", callback_data="voltar_start")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
-        return True
+_TECLADO_GERENCIAR_ADMINS = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ Adicionar Admin", callback_data="adicionar_admin")],
+    [InlineKeyboardButton("➖ Remover Admin", callback_data="remover_admin_lista")],
+    [BOTAO_VOLTAR_INICIO]
+])
+_TECLADO_VOLTAR_PAINEL = InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Voltar", callback_data="painel_controle")]])
+
+async def _cb_gerenciar_admins(query, context, super_admin_id):
+    """Lista os admins cadastrados"""
+    admins = await get_all_admins()
     
-    elif data == "adicionar_admin":
-        if not is_super_admin(user_id):
-            await query.answer("❌ Apenas o super admin pode adicionar admins.", show_alert=True)
-            return True
-        
-        context.user_data['adicionando_admin'] = True
-        await query.edit_message_text(
-            "➕ <b>Adicionar Admin</b>\n\n"
-            "Envie o ID do usuário que deseja adicionar como admin:",
-            parse_mode='HTML'
+    mensagem = "👥 <b>Gerenciar Admins</b>\n\n"
+    if not admins:
+        mensagem += "Nenhum admin cadastrado."
+    else:
+        mensagem += "Admins cadastrados:\n\n" + "".join(
+            f"• ID: <code>{admin['user_id']}</code> - @{admin['username'] or 'Sem username'}\n"
+            for admin in admins
         )
-        return True
     
-    elif data == "remover_admin_lista":
-        if not is_super_admin(user_id):
-            await query.answer("❌ Apenas o super admin pode remover admins.", show_alert=True)
-            return True
-        
-        admins = await get_all_admins()
-        if not admins:
-            await query.answer("❌ Nenhum admin cadastrado.", show_alert=True)
-            return True
-        
-        mensagem = "➖ <b>Remover Admin</b>\n\nSelecione o admin para remover:"
-        keyboard = []
+    await editar_mensagem(query, mensagem, _TECLADO_GERENCIAR_ADMINS)
+
+async def _cb_adicionar_admin(query, context, super_admin_id):
+    """Pede o ID do novo admin"""
+    context.user_data['adicionando_admin'] = True
+    await query.edit_message_text(
+        "➕ <b>Adicionar Admin</b>\n\n"
+        "Envie o ID do usuário que deseja adicionar como admin:"
+    )
+
+async def _cb_remover_admin_lista(query, context, super_admin_id):
+    """Lista os admins para remoção"""
+    admins = await get_all_admins()
+    if not admins:
+        await avisar(query, context, "❌ Nenhum admin cadastrado.", show_alert=True)
+        return
+    
+    mensagem = "➖ <b>Remover Admin</b>\n\nSelecione o admin para remover:"
+    keyboard = []
+    for admin in admins:
+        username = admin['username'] or 'Sem username'
+        aid = admin['user_id']
+        keyboard.append([
+            InlineKeyboardButton(f"❌ {username} ({aid})", callback_data=f"remover_admin_{aid}")
+        ])
+    
+    keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data="gerenciar_admins")])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await editar_mensagem(query, mensagem, reply_markup)
+
+async def _cb_remover_admin(query, context, super_admin_id):
+    """Remove um admin e recarrega a lista"""
+    admin_id = int(query.data.rsplit("_", 1)[-1])
+    if admin_id == super_admin_id:
+        await avisar(query, context, "❌ Não é possível remover o super admin.", show_alert=True)
+        return
+    
+    removed = await remove_admin(admin_id)
+    invalidar_cache_admin(admin_id)
+    if removed:
+        await avisar(query, context, "✅ Admin removido com sucesso!", show_alert=True)
+        await _cb_gerenciar_admins(query, context, super_admin_id)
+    else:
+        await avisar(query, context, "❌ Erro ao remover admin.", show_alert=True)
+
+async def _cb_painel_controle(query, context, super_admin_id):
+    """Visão geral de canais e admins"""
+    admins, all_canais = await asyncio.gather(get_all_admins(), get_all_canais())
+    total_canais = len(all_canais)
+    canais_por_admin = Counter(c['user_id'] for c in all_canais)
+    
+    mensagem = (
+        "📊 <b>Painel de Controle</b>\n\n"
+        "📈 <b>Visão Geral</b>\n\n"
+        f"📢 Total de Canais: {total_canais}\n"
+        f"👥 Total de Admins: {len(admins)}\n\n"
+    )
+    
+    if admins:
+        linhas = ["📋 <b>Canais por Admin:</b>\n\n"]
+        for admin in admins:
+            aid = admin['user_id']
+            username = admin['username'] or f"ID {aid}"
+            linhas.append(f"👤 @{username} ({aid}): {canais_por_admin[aid]} canal(is)\n")
+        mensagem += "".join(linhas)
+    
+    keyboard = []
+    if admins:
         for admin in admins:
-            username = admin['username'] or 'Sem username'
             aid = admin['user_id']
+            username = admin['username'] or f"ID {aid}"
             keyboard.append([
-                InlineKeyboardButton(f"❌ {username} ({aid})", callback_data=f"remover_admin_{aid}")
+                InlineKeyboardButton(f"📊 Ver Canais de @{username}", callback_data=f"ver_canais_admin_{aid}")
             ])
-        
-        keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data="gerenciar_admins")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
-        return True
     
-    elif data.startswith("remover_admin_"):
-        if not is_super_admin(user_id):
-            await query.answer("❌ Apenas o super admin pode remover admins.", show_alert=True)
-            return True
-        
-        admin_id = int(data.split("_")[-1])
-        if admin_id == super_admin_id:
-            await query.answer("❌ Não é possível remover o super admin.", show_alert=True)
-            return True
-        
-        removed = await remove_admin(admin_id)
-        if removed:
-            await query.answer("✅ Admin removido com sucesso!", show_alert=True)
-            # Reutiliza o handler para recarregar a lista
-            query.data = "gerenciar_admins"
-            await handle_admin_callback(query, context, super_admin_id)
-        else:
-            await query.answer("❌ Erro ao remover admin.", show_alert=True)
-        return True
+    keyboard.append([BOTAO_VOLTAR_INICIO])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await editar_mensagem(query, mensagem, reply_markup)
+
+async def _cb_ver_canais_admin(query, context, super_admin_id):
+    """Lista os canais de um admin"""
+    admin_id = int(query.data.rsplit("_", 1)[-1])
+    admin_info, canais = await asyncio.gather(get_admin(admin_id), get_all_canais(user_id=admin_id))
+    if not admin_info:
+        await avisar(query, context, "❌ Admin não encontrado.", show_alert=True)
+        return
     
-    elif data == "painel_controle":
-        if not is_super_admin(user_id):
-            await query.answer("❌ Apenas o super admin pode acessar o painel de controle.", show_alert=True)
-            return True
-        
-        admins = await get_all_admins()
-        all_canais = await get_all_canais()
-        total_canais = len(all_canais)
-        
-        mensagem = "📊 <b>Painel de Controle</b>\n\n"
-        mensagem += "📈 <b>Visão Geral</b>\n\n"
-        mensagem += f"📢 Total de Canais: {total_canais}\n"
-        mensagem += f"👥 Total de Admins: {len(admins)}\n\n"
-        
-        if admins:
-            mensagem += "📋 <b>Canais por Admin:</b>\n\n"
-            for admin in admins:
-                aid = admin['user_id']
-                username = admin['username'] or f"ID {aid}"
-                admin_canais = await get_all_canais(user_id=aid)
-                mensagem += f"👤 @{username} ({aid}): {len(admin_canais)} canal(is)\n"
-        
-        keyboard = []
-        if admins:
-            for admin in admins:
-                aid = admin['user_id']
-                username = admin['username'] or f"ID {aid}"
-                keyboard.append([
-                    InlineKeyboardButton(f"📊 Ver Canais de @{username}", callback_data=f"ver_canais_admin_{aid}")
-                ])
-        
-        keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data="voltar_start")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
-        return True
+    username = admin_info['username'] or f"ID {admin_id}"
     
-    elif data.startswith("ver_canais_admin_"):
-        if not is_super_admin(user_id):
-            await query.answer("❌ Apenas o super admin pode ver isso.", show_alert=True)
-            return True
-        
-        admin_id = int(data.split("_")[-1])
-        admin_info = await get_admin(admin_id)
-        if not admin_info:
-            await query.answer("❌ Admin não encontrado.", show_alert=True)
-            return True
-        
-        username = admin_info['username'] or f"ID {admin_id}"
-        canais = await get_all_canais(user_id=admin_id)
-        
-        mensagem = f"📊 <b>Canais de @{username}</b>\n\n"
-        if not canais:
-            mensagem += "Nenhum canal cadastrado."
-        else:
-            for canal in canais:
-                mensagem += f"📢 <b>{canal['nome']}</b> (ID: {canal['id']})\n"
-                mensagem += f"   • Canais: {len(canal['ids'])}\n"
-                mensagem += f"   • Horários: {len(canal['horarios'])}\n\n"
-        
-        keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data="painel_controle")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
+    mensagem = f"📊 <b>Canais de @{username}</b>\n\n"
+    if not canais:
+        mensagem += "Nenhum canal cadastrado."
+    else:
+        mensagem += "".join(
+            f"📢 <b>{canal['nome']}</b> (ID: {canal['id']})\n"
+            f"   • Canais: {len(canal['ids'])}\n"
+            f"   • Horários: {len(canal['horarios'])}\n\n"
+            for canal in canais
+        )
+    
+    await editar_mensagem(query, mensagem, _TECLADO_VOLTAR_PAINEL)
+
+# Todos os callbacks do painel são exclusivos do super admin: data -> (handler, aviso se negado)
+_CALLBACKS_EXATOS = {
+    "gerenciar_admins": (_cb_gerenciar_admins, "❌ Apenas o super admin pode gerenciar admins."),
+    "adicionar_admin": (_cb_adicionar_admin, "❌ Apenas o super admin pode adicionar admins."),
+    "remover_admin_lista": (_cb_remover_admin_lista, "❌ Apenas o super admin pode remover admins."),
+    "painel_controle": (_cb_painel_controle, "❌ Apenas o super admin pode acessar o painel de controle."),
+}
+# Callbacks por prefixo; "remover_admin_lista" é exato e resolvido antes
+_CALLBACKS_PREFIXO = (
+    ("remover_admin_", _cb_remover_admin, "❌ Apenas o super admin pode remover admins."),
+    ("ver_canais_admin_", _cb_ver_canais_admin, "❌ Apenas o super admin pode ver isso."),
+)
+
+async def handle_admin_callback(query, context: ContextTypes.DEFAULT_TYPE, super_admin_id: int):
+    """Handlers de callback para o painel de administração"""
+    data = query.data
+    rota = _CALLBACKS_EXATOS.get(data)
+    if rota is None:
+        rota = next(((h, aviso) for prefixo, h, aviso in _CALLBACKS_PREFIXO if data.startswith(prefixo)), None)
+    if rota is None:
+        return False
+    
+    handler, aviso = rota
+    if not is_super_admin(query.from_user.id):
+        await avisar(query, context, aviso, show_alert=True)
         return True
-        
-    return False
+    await handler(query, context, super_admin_id)
+    return True
 
 async def handle_admin_message(update: Update, context: ContextTypes.DEFAULT_TYPE, super_admin_id: int):
     """Handle para adição de admins via mensagem"""
@@ -183,19 +182,19 @@ async def handle_admin_message(update: Update, context: ContextTypes.DEFAULT_TYP
             return True
         
         try:
-            user_info = await context.bot.get_chat(admin_id)
+            user_info = await get_chat_cached(context.bot, admin_id)
             username = user_info.username
         except:
             username = None
         
         success = await add_admin(admin_id, username)
+        invalidar_cache_admin(admin_id)
         if success:
             context.user_data.pop('adicionando_admin', None)
             await update.message.reply_text(
                 f"✅ <b>Admin adicionado com sucesso!</b>\n\n"
                 f"ID: {admin_id} - @{username if username else 'Sem username'}\n\n"
-                f"O usuário agora pode usar o bot.",
-                parse_mode='HTML'
+                f"O usuário agora pode usar o bot."
             )
         else:
             await update.message.reply_text("⚠️ Este usuário já é admin ou ocorreu um erro ao adicionar.")
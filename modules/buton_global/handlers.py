@@ -7,10 +7,22 @@ from .utils import (
     get_any_buttons, save_any_buttons, delete_any_button, get_any_button_info, update_any_button
 )
 from db_helpers import toggle_inline_button_status
+from modules.utils import validar_url, limpar_chaves
 from telegram import MessageEntity
 
+# Chaves de user_data de cada etapa do assistente de botões
+_CHAVES_ASSISTENTE = {
+    'adicionando_button': ('adicionando_button', 'button_parent_id', 'button_owner_type',
+                           'button_etapa', 'button_text', 'pending_emoji_id'),
+    'editando_button': ('editando_button', 'button_etapa', 'button_field'),
+    'prompt': ('adicionando_button', 'editando_button', 'button_id', 'button_etapa', 'button_field'),
+    'todos': ('adicionando_button', 'editando_button', 'button_parent_id', 'button_owner_type',
+              'button_etapa', 'button_text', 'button_id', 'button_field', 'pending_emoji_id'),
+}
+
 async def handle_any_button_callback(query, context, owner_type='canal'):
     """Router genérico para callbacks de botões (canal ou template)"""
+    user_data = context.user_data
     data = query.data
     prefix = "global_button_tg" if owner_type == 'canal' else "fix_button_tg"
     
@@ -21,26 +33,26 @@ async def handle_any_button_callback(query, context, owner_type='canal'):
 
     if data.startswith(f"{prefix}_list_") or data == "edit_template_buttons":
         # Nota: 'edit_template_buttons' é o callback que vem do menu de template
-        if "_" in data and data.split("_")[-1].isdigit():
-            parent_id = int(data.split("_")[-1])
+        sufixo = data.rsplit("_", 1)[-1]
+        if sufixo.isdigit():
+            parent_id = int(sufixo)
         else:
             # Fallback para user_data se o ID não estiver no callback
             if owner_type == 'canal':
-                edit_data = context.user_data.get('editando', {})
+                edit_data = user_data.get('editando', {})
                 parent_id = edit_data.get('canal_id') or edit_data.get('id')
             else:
-                parent_id = context.user_data.get('editing_template_id')
+                parent_id = user_data.get('editing_template_id')
                 
         if not parent_id: return True
         # Limpa estados de edição ao voltar para a lista
-        for key in ['adicionando_button', 'editando_button', 'button_id', 'button_etapa', 'button_field']: 
-            context.user_data.pop(key, None)
+        limpar_chaves(user_data, _CHAVES_ASSISTENTE['prompt'])
             
         await mostrar_menu_botoes(query, parent_id, owner_type)
         return True
         
     elif data.startswith(f"{prefix}_style_"):
-        button_id = int(data.split("_")[-1])
+        button_id = int(data.rsplit("_", 1)[-1])
         btn_info = await get_any_button_info(button_id, owner_type)
         if not btn_info: return True
         
@@ -49,9 +61,8 @@ async def handle_any_button_callback(query, context, owner_type='canal'):
         return True
 
     elif data.startswith(f"{prefix}_setstyle_"):
-        parts = data.split("_")
-        mode = parts[-1] 
-        button_id = int(parts[-2])
+        _, button_id, mode = data.rsplit("_", 2)
+        button_id = int(button_id)
         
         await update_any_button(button_id, {"style": mode}, owner_type)
         btn_info = await get_any_button_info(button_id, owner_type)
@@ -61,16 +72,16 @@ async def handle_any_button_callback(query, context, owner_type='canal'):
         return True
 
     elif data.startswith(f"{prefix}_add_"):
-        parent_id = int(data.split("_")[-1])
-        context.user_data['adicionando_button'] = True
-        context.user_data['button_parent_id'] = parent_id
-        context.user_data['button_owner_type'] = owner_type
-        context.user_data['button_etapa'] = 'texto'
+        parent_id = int(data.rsplit("_", 1)[-1])
+        user_data['adicionando_button'] = True
+        user_data['button_parent_id'] = parent_id
+        user_data['button_owner_type'] = owner_type
+        user_data['button_etapa'] = 'texto'
         await mostrar_prompt_texto_botao(query, is_edit=False, prefix=prefix)
         return True
         
     elif data.startswith(f"{prefix}_edit_"):
-        button_id = int(data.split("_")[-1])
+        button_id = int(data.rsplit("_", 1)[-1])
         btn_info = await get_any_button_info(button_id, owner_type)
         if not btn_info: return True
         
@@ -79,40 +90,40 @@ async def handle_any_button_callback(query, context, owner_type='canal'):
         return True
 
     elif data.startswith(f"{prefix}_mt_"):
-        button_id = int(data.split("_")[-1])
+        button_id = int(data.rsplit("_", 1)[-1])
         btn_info = await get_any_button_info(button_id, owner_type)
         if not btn_info: return True
         
-        context.user_data['editando_button'] = True
-        context.user_data['button_id'] = button_id
-        context.user_data['button_owner_type'] = owner_type
-        context.user_data['button_etapa'] = 'texto'
-        context.user_data['button_field'] = 'text'
+        user_data['editando_button'] = True
+        user_data['button_id'] = button_id
+        user_data['button_owner_type'] = owner_type
+        user_data['button_etapa'] = 'texto'
+        user_data['button_field'] = 'text'
         await mostrar_prompt_texto_botao(query, is_edit=True, text_atual=btn_info['text'], prefix=prefix)
         return True
 
     elif data.startswith(f"{prefix}_mu_"):
-        button_id = int(data.split("_")[-1])
+        button_id = int(data.rsplit("_", 1)[-1])
         btn_info = await get_any_button_info(button_id, owner_type)
         if not btn_info: return True
         
-        context.user_data['editando_button'] = True
-        context.user_data['button_id'] = button_id
-        context.user_data['button_owner_type'] = owner_type
-        context.user_data['button_etapa'] = 'url'
-        context.user_data['button_field'] = 'url'
+        user_data['editando_button'] = True
+        user_data['button_id'] = button_id
+        user_data['button_owner_type'] = owner_type
+        user_data['button_etapa'] = 'url'
+        user_data['button_field'] = 'url'
         await mostrar_prompt_url_botao(query, btn_info['text'], prefix=prefix, context=context)
         return True
         
     elif data.startswith(f"{prefix}_del_"):
-        button_id = int(data.split("_")[-1])
+        button_id = int(data.rsplit("_", 1)[-1])
         btn_info = await get_any_button_info(button_id, owner_type)
         if btn_info:
             await mostrar_confirmacao_delecao(query, button_id, btn_info['text'], owner_type)
         return True
         
     elif data.startswith(f"{prefix}_cdel_"):
-        button_id = int(data.split("_")[-1])
+        button_id = int(data.rsplit("_", 1)[-1])
         btn_info = await get_any_button_info(button_id, owner_type)
         if not btn_info: return True
             
@@ -122,7 +133,7 @@ async def handle_any_button_callback(query, context, owner_type='canal'):
         return True
 
     elif data.startswith(f"{prefix}_tgl_"):
-        button_id = int(data.split("_")[-1])
+        button_id = int(data.rsplit("_", 1)[-1])
         if owner_type == 'template':
             new_status = await toggle_inline_button_status(button_id)
             btn_info = await get_any_button_info(button_id, owner_type)
@@ -134,19 +145,18 @@ async def handle_any_button_callback(query, context, owner_type='canal'):
 
     elif data.startswith(f"{prefix}_cancel_prompt") or data == "cancelar_delecao_":
         # Extrai IDs se possível
-        btn_id = context.user_data.get('button_id')
-        parent_id = context.user_data.get('button_parent_id')
+        btn_id = user_data.get('button_id')
+        parent_id = user_data.get('button_parent_id')
         
         if not parent_id:
             if owner_type == 'canal':
-                edit_data = context.user_data.get('editando', {})
+                edit_data = user_data.get('editando', {})
                 parent_id = edit_data.get('canal_id') or edit_data.get('id')
             else:
-                parent_id = context.user_data.get('editing_template_id')
+                parent_id = user_data.get('editing_template_id')
         
         # Limpa estados
-        for key in ['adicionando_button', 'editando_button', 'button_id', 'button_etapa', 'button_field']: 
-            context.user_data.pop(key, None)
+        limpar_chaves(user_data, _CHAVES_ASSISTENTE['prompt'])
 
         if btn_id:
             # Se estava editando um botão, volta para o menu dele
@@ -176,10 +186,8 @@ async def handle_any_button_message(update, context):
         parent_id = user_data.get('button_parent_id')
         owner_type = user_data.get('button_owner_type', 'canal')
         
-        # Limpa contexto genérico
-        params = ['adicionando_button', 'editando_button', 'button_parent_id', 
-                  'button_owner_type', 'button_etapa', 'button_text', 'button_id', 'button_field']
-        for key in params: user_data.pop(key, None)
+        # Limpa contexto genérico (inclui dados temporários como o emoji pendente)
+        limpar_chaves(user_data, _CHAVES_ASSISTENTE['todos'])
         
         if btn_id and parent_id:
             await mostrar_menu_edicao_botao(message, btn_id, parent_id, owner_type, texto_extra="❌ Operação cancelada.")
@@ -187,9 +195,6 @@ async def handle_any_button_message(update, context):
             await mostrar_menu_botoes(message, parent_id, owner_type, texto_extra="❌ Operação cancelada.")
         else:
             await notificar_sucesso(message, "cancelado")
-            
-        # Limpa dados temporários
-        user_data.pop('pending_emoji_id', None)
         return True
 
     # Fluxo unificado de ADICIONAR/EDITAR
@@ -212,7 +217,7 @@ async def handle_any_button_message(update, context):
                 custom_emojis = [e for e in entities if e.type == MessageEntity.CUSTOM_EMOJI]
                 
                 if len(custom_emojis) > 1:
-                    await message.reply_text("❌ Só é permitido <b>1 emoji premium</b> por botão.\nRemova os extras e tente novamente.", parse_mode='HTML')
+                    await message.reply_text("❌ Só é permitido <b>1 emoji premium</b> por botão.\nRemova os extras e tente novamente.")
                     return True
                 
                 emoji_id = None
@@ -224,20 +229,17 @@ async def handle_any_button_message(update, context):
                     text = (t_utf16[:ent.offset*2] + t_utf16[(ent.offset+ent.length)*2:]).decode('utf-16-le').strip()
                 
                 await update_any_button(button_id, {"text": text, "icon_emoji_id": emoji_id}, owner_type)
-                user_data.pop('button_etapa', None)
-                user_data.pop('button_field', None)
-                user_data.pop('editando_button', None)
+                limpar_chaves(user_data, _CHAVES_ASSISTENTE['editando_button'])
                 await mostrar_menu_edicao_botao(message, button_id, parent_id, owner_type, "✅ Nome do botão atualizado!")
                 return True
                 
             elif field == 'url':
-                if not text.startswith(('http', 'https')):
+                url = text.strip()
+                if not validar_url(url):
                     await message.reply_text("❌ URL inválida. Envie um link começando com http:// ou https://")
                     return True
-                await update_any_button(button_id, {"url": text}, owner_type)
-                user_data.pop('button_etapa', None)
-                user_data.pop('button_field', None)
-                user_data.pop('editando_button', None)
+                await update_any_button(button_id, {"url": url}, owner_type)
+                limpar_chaves(user_data, _CHAVES_ASSISTENTE['editando_button'])
                 await mostrar_menu_edicao_botao(message, button_id, parent_id, owner_type, "✅ Link do botão atualizado!")
                 return True
         
@@ -248,7 +250,7 @@ async def handle_any_button_message(update, context):
             custom_emojis = [e for e in entities if e.type == MessageEntity.CUSTOM_EMOJI]
             
             if len(custom_emojis) > 1:
-                await message.reply_text("❌ Só é permitido <b>1 emoji premium</b> por botão.\nRemova os extras e tente novamente.", parse_mode='HTML')
+                await message.reply_text("❌ Só é permitido <b>1 emoji premium</b> por botão.\nRemova os extras e tente novamente.")
                 return True
             
             emoji_id = None
@@ -267,13 +269,13 @@ async def handle_any_button_message(update, context):
             return True
             
         elif etapa == 'url':
-            if not text.startswith(('http', 'https')):
+            url = text.strip()
+            if not validar_url(url):
                 await message.reply_text("❌ URL inválida. Envie um link começando com http:// ou https://")
                 return True
                 
             button_text = user_data.get('button_text')
             emoji_id = user_data.get('pending_emoji_id')
-            url = text
             
             # Busca lista atual para adicionar à ela
             current_buttons = await get_any_buttons(parent_id, owner_type)
@@ -284,9 +286,7 @@ async def handle_any_button_message(update, context):
             await save_any_buttons(parent_id, updated_list, owner_type)
             
             # Limpa tudo
-            params = ['adicionando_button', 'button_parent_id', 'button_owner_type', 
-                      'button_etapa', 'button_text', 'pending_emoji_id']
-            for key in params: user_data.pop(key, None)
+            limpar_chaves(user_data, _CHAVES_ASSISTENTE['adicionando_button'])
             
             await mostrar_menu_botoes(message, parent_id, owner_type, texto_extra="✅ Botão adicionado!")
             return True
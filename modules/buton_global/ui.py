@@ -1,34 +1,35 @@
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from db_helpers import get_global_buttons, get_template_with_link_ids
+from modules.utils import encurtar, responder
 from .utils import get_any_buttons, get_any_button_info
 
-async def mostrar_menu_botoes(obj, parent_id, owner_type='canal', texto_extra=""):
-    """Mostra o menu de gerenciamento de botões (canal ou template)"""
-    buttons = await get_any_buttons(parent_id, owner_type)
-    
+_ICONES_ESTILO = {"primary": "🔵", "success": "🟢", "danger": "🔴", "default": "⚪"}
+
+# canal_id -> (lista de botões globais, (corpo, markup)); a lista vem do cache de db_helpers
+_menu_globais_cache = {}
+
+def _montar_menu_botoes(buttons, parent_id, owner_type):
+    """Corpo da mensagem e teclado do menu de botões (sem o texto extra)"""
     label = "Globais" if owner_type == 'canal' else "do Template"
-    mensagem = f"{texto_extra}\n" if texto_extra else ""
-    mensagem += f"🔘 <b>Botões {label}</b>\n\n"
+    parts = [f"🔘 <b>Botões {label}</b>\n\n"]
     if owner_type == 'canal':
-        mensagem += "Botões globais são aplicados a <b>TODOS</b> os templates do canal.\n\n"
+        parts.append("Botões globais são aplicados a <b>TODOS</b> os templates do canal.\n\n")
     
     if buttons:
-        mensagem += f"<b>Botões configurados ({len(buttons)}):</b>\n"
+        parts.append(f"<b>Botões configurados ({len(buttons)}):</b>\n")
         for i, button in enumerate(buttons, 1):
-            url_display = button['url'] if len(button['url']) <= 40 else button['url'][:37] + "..."
-            style_map = {"primary": "🔵", "success": "🟢", "danger": "🔴", "default": "⚪"}
-            style_icon = style_map.get(button.get('style'), "⚪")
+            url_display = encurtar(button['url'], 40)
+            style_icon = _ICONES_ESTILO.get(button.get('style'), "⚪")
             status_dot = "🟢" if button.get('status') == "ATIVO" else "🔴"
             status_text = f" ({status_dot})" if owner_type == 'template' else ""
-            mensagem += f"{i}. {style_icon} '{button['text']}'{status_text}\n   → {url_display}\n\n"
+            parts.append(f"{i}. {style_icon} '{button['text']}'{status_text}\n   → {url_display}\n\n")
     else:
-        mensagem += f"❌ Nenhum botão {label.lower()} configurado\n\n"
+        parts.append(f"❌ Nenhum botão {label.lower()} configurado\n\n")
     
     keyboard = []
     prefix = "global_button_tg" if owner_type == 'canal' else "fix_button_tg"
     
     for button in buttons:
-        button_display = button['text'][:25] + "..." if len(button['text']) > 25 else button['text']
+        button_display = encurtar(button['text'], 28)
         
         row = [
             InlineKeyboardButton(f"✏️ {button_display}", callback_data=f"{prefix}_edit_{button['id']}"),
@@ -47,13 +48,23 @@ async def mostrar_menu_botoes(obj, parent_id, owner_type='canal', texto_extra=""
     back_data = "edit_voltar" if owner_type == 'canal' else f"edit_template_{parent_id}"
     keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data=back_data)])
     
-    from telegram import CallbackQuery
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    return "".join(parts), InlineKeyboardMarkup(keyboard)
+
+async def mostrar_menu_botoes(obj, parent_id, owner_type='canal', texto_extra=""):
+    """Mostra o menu de gerenciamento de botões (canal ou template)"""
+    buttons = await get_any_buttons(parent_id, owner_type)
     
-    if isinstance(obj, CallbackQuery):
-        await obj.edit_message_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
+    if owner_type == 'canal':
+        # Reaproveitado enquanto a lista do canal for a mesma (o cache é descartado a cada escrita)
+        cached = _menu_globais_cache.get(parent_id)
+        if cached is None or cached[0] is not buttons:
+            cached = _menu_globais_cache[parent_id] = (buttons, _montar_menu_botoes(buttons, parent_id, owner_type))
+        corpo, reply_markup = cached[1]
     else:
-        await obj.reply_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
+        corpo, reply_markup = _montar_menu_botoes(buttons, parent_id, owner_type)
+    
+    mensagem = f"{texto_extra}\n{corpo}" if texto_extra else corpo
+    await responder(obj, mensagem, reply_markup)
 
 async def mostrar_menu_edicao_botao(obj, button_id, parent_id, owner_type='canal', texto_extra=""):
     """Menu para escolher o que editar no botão"""
@@ -90,12 +101,8 @@ async def mostrar_menu_edicao_botao(obj, button_id, parent_id, owner_type='canal
     
     keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data=f"{prefix}_list_{parent_id}")])
     
-    from telegram import CallbackQuery
     reply_markup = InlineKeyboardMarkup(keyboard)
-    if isinstance(obj, CallbackQuery):
-        await obj.edit_message_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
-    else:
-        await obj.reply_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
+    await responder(obj, mensagem, reply_markup)
 
 async def mostrar_prompt_texto_botao(obj, is_edit=False, text_atual=None, prefix="global_button_tg"):
     """Prompt para entrada do texto do botão"""
@@ -116,11 +123,7 @@ async def mostrar_prompt_texto_botao(obj, is_edit=False, text_atual=None, prefix
     keyboard = [[InlineKeyboardButton("✖️ Cancelar", callback_data=f"{prefix}_cancel_prompt")]]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    from telegram import CallbackQuery
-    if isinstance(obj, CallbackQuery):
-        await obj.edit_message_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
-    else:
-        await obj.reply_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
+    await responder(obj, mensagem, reply_markup)
 
 async def mostrar_prompt_url_botao(obj, text_definido, prefix="global_button_tg", context=None):
     """Prompt para entrada da URL do botão"""
@@ -133,11 +136,7 @@ async def mostrar_prompt_url_botao(obj, text_definido, prefix="global_button_tg"
     keyboard = [[InlineKeyboardButton("✖️ Cancelar", callback_data=f"{prefix}_cancel_prompt")]]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    from telegram import CallbackQuery
-    if isinstance(obj, CallbackQuery):
-        await obj.edit_message_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
-    else:
-        await obj.reply_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
+    await responder(obj, mensagem, reply_markup)
 
 async def mostrar_confirmacao_delecao(query, button_id, button_text, owner_type='canal'):
     """Gera menu de confirmação para deletar um botão"""
@@ -151,7 +150,7 @@ async def mostrar_confirmacao_delecao(query, button_id, button_text, owner_type=
         InlineKeyboardButton("✅ Confirmar", callback_data=f"{prefix}_cdel_{button_id}"),
         InlineKeyboardButton("❌ Cancelar", callback_data=f"{prefix}_cancel_prompt")
     ]]
-    await query.edit_message_text(mensagem, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+    await query.edit_message_text(mensagem, reply_markup=InlineKeyboardMarkup(keyboard))
 
 async def mostrar_menu_estilos_botao(obj, button_id, parent_id, owner_type='canal'):
     """Menu para escolher o estilo do botão"""
@@ -175,12 +174,8 @@ async def mostrar_menu_estilos_botao(obj, button_id, parent_id, owner_type='cana
         
     keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data=f"{prefix}_edit_{button_id}")])
     
-    from telegram import CallbackQuery
     reply_markup = InlineKeyboardMarkup(keyboard)
-    if isinstance(obj, CallbackQuery):
-        await obj.edit_message_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
-    else:
-        await obj.reply_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
+    await responder(obj, mensagem, reply_markup)
 
 async def notificar_sucesso(message, acao="adicionado", owner_type='canal'):
     """Notifica sucesso em uma operação"""
@@ -191,4 +186,4 @@ async def notificar_sucesso(message, acao="adicionado", owner_type='canal'):
         "deletado": f"✅ Botão {label} deletado!",
         "cancelado": "❌ Operação cancelada."
     }
-    await message.reply_text(msjs.get(acao, "✅ Operação concluída!"), parse_mode='HTML')
+    await message.reply_text(msjs.get(acao, "✅ Operação concluída!"))
@@ -3,6 +3,11 @@ import html
 from typing import List, Tuple, Optional, Dict
 from telegram import Message, MessageEntity
 
+# Tags <a>: grupo 1 = URL, grupo 2 = Conteúdo (inclui outras tags)
+_LINK_TAG_RE = re.compile(r'<a href="([^"]+)">([\s\S]*?)</a>')
+# Placeholders gravados no template: grupo 1 = N de [[link_N]]
+_PLACEHOLDER_RE = re.compile(r'\[\[link_(\d+)\]\]')
+
 class MessageParser:
     """Parser para extrair links de mensagens HTML e formatar templates preservando tags do Telegram"""
     
@@ -13,11 +18,21 @@ class MessageParser:
         Identifica automaticamente tags <a> e as substitui por placeholders [[link_N]].
         Retorna None se não houver links (pode ser usado como template estático).
         """
-        # Regex para capturar tags <a>: grupo 1 = URL, grupo 2 = Conteúdo (inclui outras tags)
-        pattern = r'<a href="([^"]+)">([\s\S]*?)</a>'
-        matches = list(re.finditer(pattern, html_text))
+        partes = []
+        segmentos = []
+        urls_originais = []
+        pos = 0
+        
+        # Uma única passada: copia o texto entre as tags e troca cada <a> pelo seu placeholder
+        for idx, match in enumerate(_LINK_TAG_RE.finditer(html_text), 1):
+            start, end = match.span()
+            partes.append(html_text[pos:start])
+            partes.append(f"[[link_{idx}]]")
+            urls_originais.append(match.group(1))
+            segmentos.append(match.group(2))
+            pos = end
         
-        if not matches:
+        if not segmentos:
             # Retorna o próprio HTML como template se não houver links
             return {
                 'template_mensagem': html_text,
@@ -27,27 +42,9 @@ class MessageParser:
                 'num_links': 0
             }
         
-        template_mensagem = html_text
-        segmentos = []
-        urls_originais = []
-        
-        # Faz as substituições de trás para frente para não bagunçar os índices
-        for i, match in enumerate(reversed(matches)):
-            idx = len(matches) - i
-            url = match.group(1)
-            content = match.group(2)
-            
-            placeholder = f"[[link_{idx}]]"
-            start, end = match.span()
-            
-            template_mensagem = template_mensagem[:start] + placeholder + template_mensagem[end:]
-            
-            # Adiciona na ordem correta no final (invertendo a reversão)
-            segmentos.insert(0, content)
-            urls_originais.insert(0, url)
-            
+        partes.append(html_text[pos:])
         return {
-            'template_mensagem': template_mensagem,
+            'template_mensagem': "".join(partes),
             'segmentos': segmentos,
             'urls_originais': urls_originais,
             'num_links': len(segmentos)
@@ -131,14 +128,11 @@ class MessageParser:
         Reconstrói a mensagem HTML substituindo placeholders [[link_N]] pelos URLs atuais.
         links: Lista de tuplas (segmento_com_tags, link_url)
         """
-        formatted = template_html
-        
-        # Substitui [[link_N]] baseado na ordem fornecida
-        for i, (segmento, link_url) in enumerate(links, 1):
-            placeholder = f"[[link_{i}]]"
-            # O link_url já deve estar devidamente escapado se vier do banco/user
-            link_html = f'<a href="{link_url}">{segmento}</a>'
-            formatted = formatted.replace(placeholder, link_html)
-            
-        return formatted
+        # O link_url já deve estar devidamente escapado se vier do banco/user
+        links_html = {
+            str(i): f'<a href="{link_url}">{segmento}</a>'
+            for i, (segmento, link_url) in enumerate(links, 1)
+        }
+        # Uma só passada pelo texto; placeholders sem link correspondente ficam como estão
+        return _PLACEHOLDER_RE.sub(lambda m: links_html.get(m.group(1), m.group(0)), template_html)
 
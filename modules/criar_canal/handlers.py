@@ -1,27 +1,37 @@
 import logging
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import ContextTypes
-from db_helpers import save_canal, get_all_canais, get_canal
+from db_helpers import save_canal
+from modules.utils import extrair_ids, limpar_chaves, responder
 # Importa o utilitário compartilhado de horários
-from modules.edit.gerenciar_time.utils import validar_horario, mostrar_painel_horarios
+from modules.edit.gerenciar_time.utils import validar_horario, separar_horarios, inserir_horarios, mostrar_painel_horarios, montar_teclado_remocao
 
 logger = logging.getLogger(__name__)
 
+_CONFIRMACAO_IDS_TMPL = "{extra_text}✅ <b>Canal: {nome_canal}</b>\n\nIDs ({total_ids}):\n"
+_TECLADO_CONFIRMACAO_IDS = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ Adicionar outro ID", callback_data="adicionar_outro_id")],
+    [InlineKeyboardButton("✅ Confirmar", callback_data="confirmar_canal")]
+])
+_TECLADO_CANCELAR_ID = InlineKeyboardMarkup([[InlineKeyboardButton("❌ Cancelar", callback_data="cancelar_adicionar_id")]])
+_TECLADO_CANCELAR_HORARIO = InlineKeyboardMarkup([[InlineKeyboardButton("❌ Cancelar", callback_data="voltar_menu_horarios")]])
+_CHAVES_CRIACAO = ('criando_canal', 'etapa', 'nome_canal', 'ids_canal', 'horarios')
+
 async def handle_criar_canal_callback(query, context):
     """Processa todos os callbacks relacionados à criação de canal"""
     data = query.data
     user_id = query.from_user.id
+    u = context.user_data
 
     if data == "criar_canal":
-        context.user_data.update({'criando_canal': True, 'etapa': 'nome', 'ids_canal': [], 'horarios': []})
-        await query.edit_message_text("📢 <b>Criar Canal</b>\n\nEnvie o nome:", parse_mode='HTML')
+        u.update({'criando_canal': True, 'etapa': 'nome', 'ids_canal': [], 'horarios': []})
+        await query.edit_message_text("📢 <b>Criar Canal</b>\n\nEnvie o nome:")
         return True
 
     elif data == "adicionar_outro_id":
-        context.user_data['etapa'] = 'id'
+        u['etapa'] = 'id'
         await query.edit_message_text("📢 <b>Adicionar ID</b>\n\nEnvie o ID:", 
-                                     reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("❌ Cancelar", callback_data="cancelar_adicionar_id")]]), 
-                                     parse_mode='HTML')
+                                     reply_markup=_TECLADO_CANCELAR_ID)
         return True
 
     elif data == "cancelar_adicionar_id":
@@ -29,30 +39,28 @@ async def handle_criar_canal_callback(query, context):
         return True
 
     elif data == "confirmar_canal":
-        context.user_data['etapa'] = 'horarios'
+        u['etapa'] = 'horarios'
         await mostrar_painel_horarios(query, context, is_edicao=False)
         return True
 
     elif data == "adicionar_horario":
-        context.user_data['etapa'] = 'adicionando_horario'
+        u['etapa'] = 'adicionando_horario'
         await query.edit_message_text("🕒 <b>Adicionar Horário</b>\n\nEnvie os horários (HH:MM, ...):", 
-                                     reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("❌ Cancelar", callback_data="voltar_menu_horarios")]]), 
-                                     parse_mode='HTML')
+                                     reply_markup=_TECLADO_CANCELAR_HORARIO)
         return True
 
     elif data == "remover_horario":
-        horarios = sorted(context.user_data.get('horarios', []))
+        horarios = u.get('horarios', [])
         if not horarios: return True
-        keyboard = [[InlineKeyboardButton(f"❌ {h}", callback_data=f"remove_h_{i}")] for i, h in enumerate(horarios)]
-        keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data="voltar_menu_horarios")])
-        await query.edit_message_text("🗑 Selecione para remover:", reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+        reply_markup = montar_teclado_remocao(horarios, "remove_h_", "voltar_menu_horarios")
+        await query.edit_message_text("🗑 Selecione para remover:", reply_markup=reply_markup)
         return True
 
     elif data.startswith("remove_h_"):
-        idx = int(data.split("_")[-1])
-        horarios = sorted(context.user_data.get('horarios', []))
+        idx = int(data.rsplit("_", 1)[-1])
+        horarios = u.get('horarios', [])
         if 0 <= idx < len(horarios):
-            context.user_data['horarios'].remove(horarios[idx])
+            del horarios[idx]
             await mostrar_painel_horarios(query, context, is_edicao=False)
         return True
 
@@ -61,10 +69,9 @@ async def handle_criar_canal_callback(query, context):
         return True
 
     elif data == "confirmar_horarios":
-        u = context.user_data
         cid = await save_canal(nome=u['nome_canal'], user_id=user_id, ids_canal=u['ids_canal'], horarios=u['horarios'])
-        for k in ['criando_canal', 'etapa', 'nome_canal', 'ids_canal', 'horarios']: u.pop(k, None)
-        await query.edit_message_text(f"✅ <b>Canal criado!</b> (ID: {cid})", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("✅ Finalizar", callback_data="voltar_start")]]), parse_mode='HTML')
+        limpar_chaves(u, _CHAVES_CRIACAO)
+        await query.edit_message_text(f"✅ <b>Canal criado!</b> (ID: {cid})", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("✅ Finalizar", callback_data="voltar_start")]]))
         return True
     
     elif data == "cancelar_criar_canal":
@@ -76,16 +83,12 @@ async def handle_criar_canal_callback(query, context):
 
 async def mostrar_confirmacao_ids(obj, context, extra_text=""):
     u = context.user_data
-    mensagem = extra_text + f"✅ <b>Canal: {u['nome_canal']}</b>\n\nIDs ({len(u['ids_canal'])}):\n" + "\n".join([f"• <code>{i}</code>" for i in u['ids_canal']])
-    keyboard = [[InlineKeyboardButton("➕ Adicionar outro ID", callback_data="adicionar_outro_id")],
-                [InlineKeyboardButton("✅ Confirmar", callback_data="confirmar_canal")]]
-    from telegram import CallbackQuery
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    ids = u['ids_canal']
+    header = _CONFIRMACAO_IDS_TMPL.format(extra_text=extra_text, nome_canal=u['nome_canal'], total_ids=len(ids))
+    mensagem = header + "\n".join(f"• <code>{i}</code>" for i in ids)
+    reply_markup = _TECLADO_CONFIRMACAO_IDS
     
-    if isinstance(obj, CallbackQuery):
-        await obj.edit_message_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
-    else:
-        await obj.reply_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
+    await responder(obj, mensagem, reply_markup)
 
 async def handle_criar_canal_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     u = context.user_data
@@ -95,28 +98,36 @@ async def handle_criar_canal_message(update: Update, context: ContextTypes.DEFAU
 
     if etapa == 'nome':
         u.update({'nome_canal': text, 'etapa': 'id'})
-        await update.message.reply_text(f"✅ Nome: {text}\nEnvie o ID do canal:")
+        await update.message.reply_text(f"✅ Nome: {text}\nEnvie o ID do canal:", parse_mode=None)
         return True
     elif etapa == 'id':
         try:
-            tid = int(text)
-            if tid not in u['ids_canal']: u['ids_canal'].append(tid)
-            success_text = f"✅ ID <code>{tid}</code> processado!\n\n"
-            await mostrar_confirmacao_ids(update.message, context, extra_text=success_text)
-        except: 
+            recebidos = extrair_ids(text)
+        except ValueError:
+            recebidos = []
+        if not recebidos:
             await update.message.reply_text("❌ ID Inválido.")
+            return True
+        ids = u['ids_canal']
+        existentes = set(ids)
+        ids.extend(tid for tid in dict.fromkeys(recebidos) if tid not in existentes)
+        if len(recebidos) == 1:
+            success_text = f"✅ ID <code>{recebidos[0]}</code> processado!\n\n"
+        else:
+            success_text = f"✅ {len(recebidos)} IDs processados!\n\n"
+        await mostrar_confirmacao_ids(update.message, context, extra_text=success_text)
         return True
     elif etapa == 'adicionando_horario':
-        novos = [h.strip() for h in text.split(",") if h.strip() and validar_horario(h.strip())]
+        novos = [h for h in separar_horarios(text) if validar_horario(h)]
         if not novos:
             await update.message.reply_text("❌ Formato inválido (HH:MM).")
             return True
-        atuais = u.get('horarios', [])
-        for h in novos: 
-            if h not in atuais: atuais.append(h)
-        u['horarios'] = atuais
+        adicionados = inserir_horarios(u.setdefault('horarios', []), novos)
+        if not adicionados:
+            await update.message.reply_text("ℹ️ Nenhum horário novo.")
+            return True
         u['etapa'] = 'horarios'
-        success_text = f"✅ {len(novos)} horário(s) processado(s)!\n\n"
+        success_text = f"✅ {len(adicionados)} horário(s) processado(s)!\n\n"
         await mostrar_painel_horarios(update.message, context, is_edicao=False, extra_text=success_text)
         return True
     return False
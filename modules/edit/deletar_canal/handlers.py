@@ -1,12 +1,14 @@
 import logging
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
-from telegram.ext import ContextTypes
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from db_helpers import get_canal, delete_canal
-from modules.utils import is_super_admin
+from modules.utils import is_super_admin, avisar
 from modules.ui import mostrar_menu_edicao
 
 logger = logging.getLogger(__name__)
 
+_LINHA_CANCELAR_DELECAO = (InlineKeyboardButton("⬅️ Cancelar", callback_data="cancelar_deletar_canal"),)
+_TECLADO_CANAL_DELETADO = InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Voltar ao Menu", callback_data="voltar_start")]])
+
 async def handle_deletar_canal_callback(query, context):
     """Handlers de callback para exclusão de canais"""
     data = query.data
@@ -17,20 +19,20 @@ async def handle_deletar_canal_callback(query, context):
         dados = context.user_data.get('editando', {})
         
         if not dados:
-            await query.answer("❌ Erro: dados não encontrados.", show_alert=True)
+            await avisar(query, context, "❌ Erro: dados não encontrados.", show_alert=True)
             return True
         
-        canal_id = dados.get('canal_id')
-        nome_canal = dados.get('nome', 'Canal')
+        canal_id = dados['canal_id']
+        nome_canal = dados['nome']
         
         # Verifica permissão
         canal = await get_canal(canal_id)
         if not canal:
-            await query.answer("❌ Canal não encontrado.", show_alert=True)
+            await avisar(query, context, "❌ Canal não encontrado.", show_alert=True)
             return True
         
         if not is_super_admin(user_id) and canal['user_id'] != user_id:
-            await query.answer("❌ Você não tem permissão para deletar este canal.", show_alert=True)
+            await avisar(query, context, "❌ Você não tem permissão para deletar este canal.", show_alert=True)
             return True
         
         # Mostra confirmação
@@ -48,27 +50,25 @@ async def handle_deletar_canal_callback(query, context):
             [
                 InlineKeyboardButton("❌ Confirmar Deletar", callback_data=f"confirmar_deletar_canal_{canal_id}"),
             ],
-            [
-                InlineKeyboardButton("⬅️ Cancelar", callback_data="cancelar_deletar_canal"),
-            ]
+            _LINHA_CANCELAR_DELECAO
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await query.edit_message_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
+        await query.edit_message_text(mensagem, reply_markup=reply_markup)
         return True
     
     elif data.startswith("confirmar_deletar_canal_"):
         # Confirma e deleta o canal
-        canal_id = int(data.split("_")[-1])
+        canal_id = int(data.rsplit("_", 1)[-1])
         
         # Verifica permissão novamente
         canal = await get_canal(canal_id)
         if not canal:
-            await query.answer("❌ Canal não encontrado.", show_alert=True)
+            await avisar(query, context, "❌ Canal não encontrado.", show_alert=True)
             return True
         
         if not is_super_admin(user_id) and canal['user_id'] != user_id:
-            await query.answer("❌ Você não tem permissão para deletar este canal.", show_alert=True)
+            await avisar(query, context, "❌ Você não tem permissão para deletar este canal.", show_alert=True)
             return True
         
         nome_canal = canal['nome']
@@ -78,31 +78,22 @@ async def handle_deletar_canal_callback(query, context):
         
         if deleted:
             # Limpa contexto de edição
-            if 'editando' in context.user_data:
-                del context.user_data['editando']
+            context.user_data.pop('editando', None)
             
             # Mensagem de sucesso com botão para voltar ao menu
-            keyboard = [
-                [
-                    InlineKeyboardButton("⬅️ Voltar ao Menu", callback_data="voltar_start"),
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
             await query.edit_message_text(
                 f"✅ <b>Canal deletado com sucesso!</b>\n\n"
                 f"📢 <b>{nome_canal}</b> foi permanentemente removido.\n\n"
                 f"Todos os dados relacionados foram excluídos.",
-                reply_markup=reply_markup,
-                parse_mode='HTML'
+                reply_markup=_TECLADO_CANAL_DELETADO
             )
         else:
-            await query.answer("❌ Erro ao deletar canal.", show_alert=True)
+            await avisar(query, context, "❌ Erro ao deletar canal.", show_alert=True)
         return True
     
     elif data == "cancelar_deletar_canal":
         # Cancela a deleção e volta para o menu de edição
-        await mostrar_menu_edicao_callback(query, context)
+        await mostrar_menu_edicao(query, context)
         return True
         
     return False
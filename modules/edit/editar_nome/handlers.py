@@ -1,4 +1,4 @@
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram import Update
 from telegram.ext import ContextTypes
 
 async def handle_edit_nome_callback(query, context):
@@ -9,8 +9,7 @@ async def handle_edit_nome_callback(query, context):
         nome_atual = context.user_data['editando']['nome']
         
         await query.edit_message_text(
-            f"📛 <b>Editar Nome</b>\n\nNome atual: <b>{nome_atual}</b>\n\nEnvie o novo nome:",
-            parse_mode='HTML'
+            f"📛 <b>Editar Nome</b>\n\nNome atual: <b>{nome_atual}</b>\n\nEnvie o novo nome:"
         )
         return True
     return False
@@ -29,7 +28,7 @@ async def handle_edit_nome_message(update: Update, context: ContextTypes.DEFAULT
         # Atualiza o nome e gera feedback
         dados['nome'] = message_text
         dados['changes_made'] = True
-        del dados['etapa']
+        dados['etapa'] = None
         
         from modules.ui import mostrar_menu_edicao
         success_text = f"✅ <b>Nome atualizado com sucesso!</b>\n\n"
@@ -1,44 +1,53 @@
+import asyncio
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import ContextTypes
+from modules.utils import get_chat_cached, bot_e_admin, responder, extrair_ids, SESSAO_VAZIA, BOTAO_VOLTAR_EDICAO
+from modules.edit.gerenciar_time.utils import montar_teclado_remocao
 
-async def mostrar_menu_ids(query, context):
-    """Mostra o menu de gerenciamento de IDs"""
-    dados = context.user_data.get('editando', {})
-    ids = dados.get('ids', [])
-    
-    mensagem = "🆔 <b>Gerenciar IDs</b>\n\n"
-    
-    if ids:
-        mensagem += "<b>IDs configurados:</b>\n"
-        for i, canal_id_str in enumerate(ids, 1):
-            mensagem += f"{i}. <code>{canal_id_str}</code>\n"
-    else:
-        mensagem += "❌ Nenhum ID configurado\n"
-    
-    mensagem += f"\nTotal: {len(ids)} ID(s)"
-    
+def _montar_teclado_ids(tem_ids):
+    """Monta o teclado do menu de IDs"""
     keyboard = [
         [
             InlineKeyboardButton("➕ Adicionar ID", callback_data="edit_add_id"),
         ],
     ]
     
-    if ids:
+    if tem_ids:
         keyboard.append([
             InlineKeyboardButton("🗑 Remover ID", callback_data="edit_remove_id"),
         ])
     
     keyboard.append([
-        InlineKeyboardButton("⬅️ Voltar", callback_data="edit_voltar"),
+        BOTAO_VOLTAR_EDICAO,
     ])
+    return InlineKeyboardMarkup(keyboard)
+
+_TECLADO_IDS_VAZIO = _montar_teclado_ids(False)
+_TECLADO_IDS = _montar_teclado_ids(True)
+_TECLADO_CANCELAR_ADICAO_ID = InlineKeyboardMarkup([[InlineKeyboardButton("❌ Cancelar", callback_data="edit_voltar")]])
+_CABECALHO_IDS = "🆔 <b>Gerenciar IDs</b>\n\n"
+_LISTA_IDS = "<b>IDs configurados:</b>\n"
+_SEM_IDS = "❌ Nenhum ID configurado\n"
+_LINHA_ID_TMPL = "{}. <code>{}</code>\n"
+_TOTAL_IDS_TMPL = "\nTotal: {} ID(s)"
+
+async def mostrar_menu_ids(query, context, extra_text=""):
+    """Mostra o menu de gerenciamento de IDs"""
+    dados = context.user_data.get('editando', SESSAO_VAZIA)
+    ids = dados.get('ids', ())
     
-    from telegram import CallbackQuery
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    if isinstance(query, CallbackQuery):
-        await query.edit_message_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
+    parts = [extra_text, _CABECALHO_IDS]
+    if ids:
+        parts.append(_LISTA_IDS)
+        parts.extend(_LINHA_ID_TMPL.format(i, canal_id) for i, canal_id in enumerate(ids, 1))
     else:
-        await query.reply_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
+        parts.append(_SEM_IDS)
+    parts.append(_TOTAL_IDS_TMPL.format(len(ids)))
+    mensagem = "".join(parts)
+    
+    reply_markup = _TECLADO_IDS if ids else _TECLADO_IDS_VAZIO
+    
+    await responder(query, mensagem, reply_markup)
 
 async def handle_edit_ids_callback(query, context):
     """Handlers de callback para gerenciamento de IDs"""
@@ -52,60 +61,39 @@ async def handle_edit_ids_callback(query, context):
         # Inicia adição de ID
         context.user_data['editando']['etapa'] = 'adicionando_id'
         
-        keyboard = [
-            [
-                InlineKeyboardButton("❌ Cancelar", callback_data="edit_voltar"),
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
         await query.edit_message_text(
             "🆔 <b>Adicionar ID</b>\n\nEnvie o ID do Telegram do canal:",
-            reply_markup=reply_markup,
-            parse_mode='HTML'
+            reply_markup=_TECLADO_CANCELAR_ADICAO_ID
         )
         return True
         
     elif data == "edit_remove_id":
         # Mostra lista de IDs para remover
-        dados = context.user_data.get('editando', {})
-        ids = dados.get('ids', [])
+        dados = context.user_data.get('editando', SESSAO_VAZIA)
+        ids = dados.get('ids', ())
         
         if not ids:
             await query.edit_message_text(
-                "⚠️ Nenhum ID para remover.",
-                parse_mode='HTML'
+                "⚠️ Nenhum ID para remover."
             )
             return True
         
-        keyboard = []
-        for i, canal_id in enumerate(ids):
-            keyboard.append([
-                InlineKeyboardButton(f"❌ {canal_id}", callback_data=f"edit_remove_id_{i}")
-            ])
-        
-        keyboard.append([
-            InlineKeyboardButton("⬅️ Voltar", callback_data="edit_ids"),
-        ])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = montar_teclado_remocao(ids, "edit_remove_id_", "edit_ids")
         
         await query.edit_message_text(
             "🗑 <b>Remover ID</b>\n\nSelecione o ID para remover:",
-            reply_markup=reply_markup,
-            parse_mode='HTML'
+            reply_markup=reply_markup
         )
         return True
         
     elif data.startswith("edit_remove_id_"):
         # Remove um ID específico
-        index = int(data.split("_")[-1])
-        dados = context.user_data.get('editando', {})
-        ids = dados.get('ids', [])
+        index = int(data.rsplit("_", 1)[-1])
+        dados = context.user_data.get('editando', SESSAO_VAZIA)
+        ids = dados.get('ids', ())
         
         if 0 <= index < len(ids):
-            ids.pop(index)
-            dados['ids'] = ids
+            del ids[index]
             dados['changes_made'] = True
             
             await mostrar_menu_ids(query, context)
@@ -113,6 +101,26 @@ async def handle_edit_ids_callback(query, context):
         
     return False
 
+async def _verificar_canal(bot, telegram_id):
+    """Confere se o bot é admin do canal; retorna (telegram_id, título, mensagem de erro ou None)"""
+    try:
+        is_admin = await bot_e_admin(bot, telegram_id)
+    except Exception as e:
+        if 'not found' in str(e).lower():
+            return telegram_id, None, f"❌ Canal <code>{telegram_id}</code> não encontrado."
+        return telegram_id, None, f"❌ Erro: {str(e)[:100]}"
+    
+    if not is_admin:
+        return telegram_id, None, f"❌ Bot não é admin do canal <code>{telegram_id}</code>"
+    
+    # Busca o nome do canal/grupo
+    try:
+        chat = await get_chat_cached(bot, telegram_id)
+        chat_title = chat.title or chat.username or f"Canal {telegram_id}"
+    except Exception:
+        chat_title = f"Canal {telegram_id}"
+    return telegram_id, chat_title, None
+
 async def handle_edit_ids_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Processa ID enviado pelo usuário"""
     if 'editando' not in context.user_data:
@@ -122,82 +130,48 @@ async def handle_edit_ids_message(update: Update, context: ContextTypes.DEFAULT_
     etapa = dados.get('etapa')
     
     if etapa == 'adicionando_id':
-        message_text = update.message.text
-        # Adiciona novo ID
+        # Aceita vários IDs de uma vez (vírgula, espaço ou quebra de linha)
         try:
-            telegram_id = int(message_text.strip())
-            
-            # Verifica se o bot é admin
-            try:
-                bot_member = await context.bot.get_chat_member(
-                    chat_id=telegram_id,
-                    user_id=context.bot.id
-                )
-                
-                is_admin = (
-                    bot_member.status == 'administrator' or 
-                    bot_member.status == 'creator'
-                )
-                
-                if not is_admin:
-                    await update.message.reply_text(
-                        f"❌ Bot não é admin do canal <code>{telegram_id}</code>",
-                        parse_mode='HTML'
-                    )
-                    return True
-                
-                # Busca o nome do canal/grupo
-                try:
-                    chat = await context.bot.get_chat(telegram_id)
-                    chat_title = chat.title or chat.username or f"Canal {telegram_id}"
-                except Exception:
-                    chat_title = f"Canal {telegram_id}"
-                
-                # Verifica se o ID já existe
-                ids = dados.get('ids', [])
-                if str(telegram_id) in ids:
-                    await update.message.reply_text(
-                        f"⚠️ ID <code>{telegram_id}</code> já foi adicionado.\n\n" +
-                        "IDs atuais:\n" +
-                        "\n".join([f"<code>{cid}</code>" for cid in ids]),
-                        parse_mode='HTML'
-                    )
-                    return True
-                
-                # Adiciona o ID
-                ids.append(str(telegram_id))
-                dados['ids'] = ids
-                dados['changes_made'] = True
-                del dados['etapa']
-                
-                # Envia mensagem inicial de sucesso
-                msg = await update.message.reply_text(
-                    f"✅ ID <code>{telegram_id}</code> adicionado!\n"
-                    f"📝 <b>Nome:</b> {chat_title}",
-                    parse_mode='HTML'
-                )
-                
-                # Mostra o menu de IDs na mesma mensagem (ou nova se preferir)
-                await mostrar_menu_ids(msg, context)
-                
-            except Exception as e:
-                error_msg = str(e).lower()
-                if 'chat not found' in error_msg or 'not found' in error_msg:
-                    await update.message.reply_text(
-                        f"❌ Canal <code>{telegram_id}</code> não encontrado.",
-                        parse_mode='HTML'
-                    )
-                else:
-                    await update.message.reply_text(
-                        f"❌ Erro: {str(e)[:100]}",
-                        parse_mode='HTML'
-                    )
-                    
+            recebidos = list(dict.fromkeys(extrair_ids(update.message.text)))
         except ValueError:
+            recebidos = []
+        if not recebidos:
             await update.message.reply_text(
-                "⚠️ ID inválido. Envie um número.",
-                parse_mode='HTML'
+                "⚠️ ID inválido. Envie um número."
             )
+            return True
+        
+        # Verifica duplicados antes de consultar a API do Telegram
+        ids = dados['ids']
+        existentes = set(ids)
+        novos = [tid for tid in recebidos if str(tid) not in existentes]
+        if not novos:
+            await update.message.reply_text(
+                f"⚠️ ID <code>{recebidos[0]}</code> já foi adicionado.\n\n" +
+                "IDs atuais:\n" +
+                "\n".join([f"<code>{cid}</code>" for cid in ids])
+            )
+            return True
+        
+        # Uma verificação por canal, todas em paralelo
+        resultados = await asyncio.gather(*(_verificar_canal(context.bot, tid) for tid in novos))
+        linhas = []
+        for telegram_id, chat_title, erro in resultados:
+            if erro:
+                linhas.append(erro)
+                continue
+            ids.append(str(telegram_id))
+            linhas.append(f"✅ ID <code>{telegram_id}</code> adicionado!\n📝 <b>Nome:</b> {chat_title}")
+        linhas.extend(f"⚠️ ID <code>{tid}</code> já foi adicionado." for tid in recebidos if str(tid) in existentes)
+        
+        adicionou = any(erro is None for _, _, erro in resultados)
+        if adicionou:
+            dados['changes_made'] = True
+            dados['etapa'] = None
+            # Resultado e menu de IDs numa única mensagem
+            await mostrar_menu_ids(update.message, context, extra_text="\n\n".join(linhas) + "\n\n")
+        else:
+            await update.message.reply_text("\n\n".join(linhas))
         return True
         
     return False
@@ -1,8 +1,9 @@
+import html
 import logging
 from datetime import datetime, timedelta, timezone
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import ContextTypes
-from modules.utils import require_admin, strip_html_tags
+from modules.utils import require_admin, serialize_per_user, strip_html_tags, encurtar, limpar_chaves, editar_mensagem, avisar, BOTAO_VOLTAR_EDICAO
 from db_helpers import (
     get_media_groups_by_user, get_media_group, delete_media_group,
     create_media_group, update_media_group, add_media_to_group,
@@ -24,6 +25,12 @@ except ImportError:
     except ImportError:
         BRASILIA_TZ = timezone(timedelta(hours=-3))
 
+_TECLADO_CANCELAR_MIDIA = InlineKeyboardMarkup([[InlineKeyboardButton("❌ Cancelar", callback_data="edit_medias")]])
+# Chaves do fluxo de mídia limpas ao concluir um grupo e ao voltar ao menu de mídias
+_CHAVES_GRUPO_MIDIA = ('salvando_midia', 'tipo_midia', 'canal_id_midia', 'medias_temporarias', 'template_id_pendente')
+_CHAVES_MENU_MIDIA = ('salvando_midia', 'tipo_midia', 'canal_id_midia', 'count_batch', 'medias_temporarias', 'batch_message_ids')
+_TECLADO_FINALIZAR_LOTE = InlineKeyboardMarkup([[InlineKeyboardButton("🔚 Finalizar e Voltar", callback_data="edit_medias")]])
+
 async def mostrar_menu_medias(query, context):
     """Mostra o menu de gerenciamento de mídias"""
     user_id = query.from_user.id
@@ -31,7 +38,7 @@ async def mostrar_menu_medias(query, context):
     canal_id = dados.get('canal_id')
     
     if not canal_id:
-        await query.edit_message_text("❌ Erro: canal não encontrado.", parse_mode='HTML')
+        await query.edit_message_text("❌ Erro: canal não encontrado.")
         return
 
     # Busca mídias do usuário para este canal
@@ -65,18 +72,18 @@ async def mostrar_menu_medias(query, context):
     
     
     keyboard.append([
-        InlineKeyboardButton("⬅️ Voltar", callback_data="edit_voltar")
+        BOTAO_VOLTAR_EDICAO
     ])
     
     reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
+    await editar_mensagem(query, mensagem, reply_markup)
 
 async def mostrar_detalhes_grupo_midia(query, context, group_id: int):
     """Mostra detalhes de um grupo de mídias"""
     group = await get_media_group(group_id)
     
     if not group:
-        await query.edit_message_text("❌ Grupo de mídias não encontrado.", parse_mode='HTML')
+        await query.edit_message_text("❌ Grupo de mídias não encontrado.")
         return
         
     nome = group['nome']
@@ -90,9 +97,8 @@ async def mostrar_detalhes_grupo_midia(query, context, group_id: int):
     if template_id:
         template = await get_template(template_id)
         if template:
-            import html
             clean_text = strip_html_tags(template['template_mensagem'])
-            preview = html.escape(clean_text[:30]) + "..." if len(clean_text) > 30 else html.escape(clean_text)
+            preview = html.escape(encurtar(clean_text, 33))
             mensagem += f"📝 Template: {preview} (ID: {template_id})\n"
         else:
             mensagem += "📝 Template: ID " + str(template_id) + " (Não encontrado)\n"
@@ -115,18 +121,18 @@ async def mostrar_detalhes_grupo_midia(query, context, group_id: int):
     ])
     
     reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
+    await editar_mensagem(query, mensagem, reply_markup)
 
 async def enviar_preview_grupo_midia(query, context, group_id: int, media_handler, db):
     """Envia preview do grupo de mídias com template e botões"""
     group = await get_media_group(group_id)
     
     if not group:
-        await query.edit_message_text("❌ Grupo de mídias não encontrado.", parse_mode='HTML')
+        await query.edit_message_text("❌ Grupo de mídias não encontrado.")
         return
         
     if not group.get('medias'):
-        await query.edit_message_text("❌ Grupo de mídias está vazio.", parse_mode='HTML')
+        await query.edit_message_text("❌ Grupo de mídias está vazio.")
         return
     
     # Busca template se houver associado
@@ -140,8 +146,8 @@ async def enviar_preview_grupo_midia(query, context, group_id: int, media_handle
         global_buttons = await get_global_buttons(group['canal_id'])
     
     # Envia mensagem de carregamento
-    await query.answer("📤 Enviando preview...")
-    await query.edit_message_text("📤 <b>Enviando preview...</b>", parse_mode='HTML')
+    await avisar(query, context, "📤 Enviando preview...")
+    await query.edit_message_text("📤 <b>Enviando preview...</b>")
     
     try:
         user_id = query.from_user.id
@@ -159,29 +165,30 @@ async def enviar_preview_grupo_midia(query, context, group_id: int, media_handle
             keyboard = [[InlineKeyboardButton("⬅️ Voltar", callback_data=f"ver_grupo_midia_{group_id}")]]
             await query.edit_message_text(
                 "✅ <b>Preview enviado!</b>\n\nVerifique a mensagem acima.",
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode='HTML'
+                reply_markup=InlineKeyboardMarkup(keyboard)
             )
         else:
             await query.edit_message_text("❌ Erro ao enviar preview.")
     except Exception as e:
         logger.error(f"Erro ao enviar preview: {e}")
-        await query.edit_message_text(f"❌ Erro ao enviar preview: {str(e)[:100]}")
+        await query.edit_message_text(f"❌ Erro ao enviar preview: {str(e)[:100]}", parse_mode=None)
 
 @require_admin
+@serialize_per_user
 async def finalizar_grupo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Comando para finalizar criação de grupo de mídias"""
-    if not context.user_data.get('salvando_midia') or context.user_data.get('tipo_midia') != 'agrupada':
+    user_data = context.user_data
+    if not user_data.get('salvando_midia') or user_data.get('tipo_midia') != 'agrupada':
         await update.message.reply_text("❌ Você não está criando um grupo de mídias.")
         return
     
-    medias_temp = context.user_data.get('medias_temporarias', [])
+    medias_temp = user_data.get('medias_temporarias', [])
     if len(medias_temp) == 0:
         await update.message.reply_text("❌ Nenhuma mídia foi adicionada.")
         return
     
     user_id = update.message.from_user.id
-    canal_id = context.user_data.get('canal_id_midia')
+    canal_id = user_data.get('canal_id_midia')
     
     # Captura template automático se a primeira mídia do lote tiver legenda
     template_id = None
@@ -189,7 +196,7 @@ async def finalizar_grupo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Nota: Idealmente pegaríamos a legenda da primeira mensagem do lote.
         # Mas no modo 'agrupada' com /finalizar_grupo, as mensagens individuais já passaram.
         # Precisamos garantir que armazenamos o template_id no contexto durante o handle_input.
-        template_id = context.user_data.get('template_id_pendente')
+        template_id = user_data.get('template_id_pendente')
 
     group_id = await create_media_group(
         nome=f"Grupo {datetime.now(BRASILIA_TZ).strftime('%d/%m/%Y %H:%M')}",
@@ -202,18 +209,18 @@ async def finalizar_grupo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await add_media_to_group(group_id, media_id, ordem=ordem)
     
     # Limpa contexto
-    for key in ['salvando_midia', 'tipo_midia', 'canal_id_midia', 'medias_temporarias', 'template_id_pendente']:
-        context.user_data.pop(key, None)
+    limpar_chaves(user_data, _CHAVES_GRUPO_MIDIA)
     
     await mostrar_menu_edicao(update.message, context, extra_text=f"✅ <b>Grupo criado!</b>\n\nID: {group_id}\nMídias: {len(medias_temp)}")
 
 async def handle_edit_media_callback(query, context, media_handler, db):
     """Handlers de callback para mídias"""
+    user_data = context.user_data
     data = query.data
     
     if data == "edit_medias":
         # Limpeza de mensagens de lote (exceto a atual que será editada)
-        batch_ids = context.user_data.get('batch_message_ids', [])
+        batch_ids = user_data.get('batch_message_ids', [])
         current_msg_id = query.message.message_id
         
         for msg_id in batch_ids:
@@ -223,15 +230,14 @@ async def handle_edit_media_callback(query, context, media_handler, db):
                 except Exception:
                     pass
         
-        for key in ['salvando_midia', 'tipo_midia', 'canal_id_midia', 'count_batch', 'medias_temporarias', 'batch_message_ids']:
-            context.user_data.pop(key, None)
+        limpar_chaves(user_data, _CHAVES_MENU_MIDIA)
             
         await mostrar_menu_medias(query, context)
         return True
         
     elif data == "salvar_midia_unica":
-        canal_id = context.user_data.get('editando', {}).get('canal_id')
-        context.user_data.update({
+        canal_id = user_data.get('editando', {}).get('canal_id')
+        user_data.update({
             'salvando_midia': True, 
             'tipo_midia': 'unica', 
             'canal_id_midia': canal_id, 
@@ -239,70 +245,67 @@ async def handle_edit_media_callback(query, context, media_handler, db):
             'batch_message_ids': []
         })
         await query.edit_message_text("📸 <b>Mídia Única</b>\n\nEnvie uma foto ou vídeo.", 
-                                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("❌ Cancelar", callback_data="edit_medias")]]), 
-                                    parse_mode='HTML')
+                                    reply_markup=_TECLADO_CANCELAR_MIDIA)
         # Adiciona o prompt inicial na lista de limpeza
-        context.user_data['batch_message_ids'].append(query.message.message_id)
+        user_data['batch_message_ids'].append(query.message.message_id)
         return True
         
     elif data == "salvar_midia_agrupada":
-        canal_id = context.user_data.get('editando', {}).get('canal_id')
-        context.user_data.update({'salvando_midia': True, 'tipo_midia': 'agrupada', 'canal_id_midia': canal_id, 'medias_temporarias': []})
+        canal_id = user_data.get('editando', {}).get('canal_id')
+        user_data.update({'salvando_midia': True, 'tipo_midia': 'agrupada', 'canal_id_midia': canal_id, 'medias_temporarias': []})
         await query.edit_message_text("📦 <b>Mídia Agrupada</b>\n\nEnvie até 10 mídias e use /finalizar_grupo.", 
-                                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("❌ Cancelar", callback_data="edit_medias")]]), 
-                                    parse_mode='HTML')
+                                    reply_markup=_TECLADO_CANCELAR_MIDIA)
         return True
         
     elif data.startswith("ver_grupo_midia_"):
-        await mostrar_detalhes_grupo_midia(query, context, int(data.split("_")[-1]))
+        await mostrar_detalhes_grupo_midia(query, context, int(data.rsplit("_", 1)[-1]))
         return True
         
     elif data.startswith("deletar_grupo_midia_"):
-        group_id = int(data.split("_")[-1])
+        group_id = int(data.rsplit("_", 1)[-1])
         keyboard = [[InlineKeyboardButton("✅ Sim", callback_data=f"confirmar_deletar_grupo_{group_id}"),
                      InlineKeyboardButton("❌ Não", callback_data="edit_medias")]]
-        await query.edit_message_text("⚠️ Deletar este grupo?", reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+        await query.edit_message_text("⚠️ Deletar este grupo?", reply_markup=InlineKeyboardMarkup(keyboard))
         return True
         
     elif data.startswith("confirmar_deletar_grupo_"):
-        if await delete_media_group(int(data.split("_")[-1])):
-            await query.answer("✅ Deletado!")
+        if await delete_media_group(int(data.rsplit("_", 1)[-1])):
+            await avisar(query, context, "✅ Deletado!")
             await mostrar_menu_medias(query, context)
         return True
         
     elif data.startswith("preview_grupo_midia_"):
-        await enviar_preview_grupo_midia(query, context, int(data.split("_")[-1]), media_handler, db)
+        await enviar_preview_grupo_midia(query, context, int(data.rsplit("_", 1)[-1]), media_handler, db)
         return True
 
     elif data.startswith("associar_template_grupo_"):
-        group_id = int(data.split("_")[-1])
-        canal_id = context.user_data.get('editando', {}).get('canal_id')
+        group_id = int(data.rsplit("_", 1)[-1])
+        canal_id = user_data.get('editando', {}).get('canal_id')
         templates = await get_templates_by_canal(canal_id)
         if not templates:
-            await query.answer("❌ Nenhum template encontrado.", show_alert=True)
+            await avisar(query, context, "❌ Nenhum template encontrado.", show_alert=True)
             return True
         keyboard = []
         for t in templates:
-            import html
             clean_text = strip_html_tags(t['template_mensagem'])
-            preview = html.escape(clean_text[:30]) + "..." if len(clean_text) > 30 else html.escape(clean_text)
+            preview = html.escape(encurtar(clean_text, 33))
             keyboard.append([InlineKeyboardButton(f"📄 {preview}", callback_data=f"conf_assoc_temp_{group_id}_{t['id']}")])
         keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data=f"ver_grupo_midia_{group_id}")])
-        await query.edit_message_text("📝 Escolha o template:", reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+        await query.edit_message_text("📝 Escolha o template:", reply_markup=InlineKeyboardMarkup(keyboard))
         return True
 
     elif data.startswith("conf_assoc_temp_"):
-        parts = data.split("_")
-        group_id, template_id = int(parts[-2]), int(parts[-1])
+        _, group_id, template_id = data.rsplit("_", 2)
+        group_id, template_id = int(group_id), int(template_id)
         await update_media_group(group_id, template_id=template_id)
-        await query.answer("✅ Template associado!")
+        await avisar(query, context, "✅ Template associado!")
         await mostrar_detalhes_grupo_midia(query, context, group_id)
         return True
 
     elif data.startswith("remover_template_grupo_"):
-        group_id = int(data.split("_")[-1])
+        group_id = int(data.rsplit("_", 1)[-1])
         await update_media_group(group_id, remove_template=True)
-        await query.answer("✅ Template removido!")
+        await avisar(query, context, "✅ Template removido!")
         await mostrar_detalhes_grupo_midia(query, context, group_id)
         return True
 
@@ -311,11 +314,12 @@ async def handle_edit_media_callback(query, context, media_handler, db):
 
 async def handle_edit_media_input(update: Update, context: ContextTypes.DEFAULT_TYPE, media_handler):
     """Processa entrada de mídias (fotos/vídeos)"""
-    if not context.user_data.get('salvando_midia'):
+    user_data = context.user_data
+    if not user_data.get('salvando_midia'):
         return False
         
-    tipo = context.user_data.get('tipo_midia')
-    canal_id = context.user_data.get('canal_id_midia')
+    tipo = user_data.get('tipo_midia')
+    canal_id = user_data.get('canal_id_midia')
     media_id = await media_handler.save_media_from_message(update)
     
     if not media_id:
@@ -335,30 +339,30 @@ async def handle_edit_media_input(update: Update, context: ContextTypes.DEFAULT_
         await add_media_to_group(group_id, media_id, ordem=1)
         
         # Incrementa contador de lote para feedback
-        count = context.user_data.get('count_batch', 0) + 1
-        context.user_data['count_batch'] = count
+        count = user_data.get('count_batch', 0) + 1
+        user_data['count_batch'] = count
         
         reply = await update.message.reply_text(
             f"✅ Mídia solo #{count} salva! Continue enviando ou clique no botão abaixo para finalizar.",
-            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔚 Finalizar e Voltar", callback_data="edit_medias")]])
+            reply_markup=_TECLADO_FINALIZAR_LOTE
         )
         
         # Armazena ID para limpeza posterior
-        batch_ids = context.user_data.get('batch_message_ids', [])
+        batch_ids = user_data.get('batch_message_ids', [])
         batch_ids.append(reply.message_id)
-        context.user_data['batch_message_ids'] = batch_ids
+        user_data['batch_message_ids'] = batch_ids
     else:
-        medias = context.user_data.get('medias_temporarias', [])
+        medias = user_data.get('medias_temporarias', [])
         if len(medias) >= 10:
             await update.message.reply_text("❌ Limite de 10 mídias.")
         else:
             # Se for a primeira mídia do grupo e tiver legenda, salva como template do grupo
             if len(medias) == 0 and update.message.caption:
                 template_id = await processar_e_salvar_template_da_legenda(update.message, canal_id)
-                context.user_data['template_id_pendente'] = template_id
+                user_data['template_id_pendente'] = template_id
 
             medias.append(media_id)
-            context.user_data['medias_temporarias'] = medias
+            user_data['medias_temporarias'] = medias
             await update.message.reply_text(f"✅ Adicionada ({len(medias)}/10). Use /finalizar_grupo para salvar.")
             
     return True
@@ -1,41 +1,79 @@
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery
+from functools import lru_cache
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from modules.utils import strip_html_tags
+from modules.utils import strip_html_tags, encurtar, responder, BOTAO_VOLTAR_EDICAO, BOTAO_VOLTAR_TEMPLATES
 
-async def mostrar_lista_templates(obj, templates, canal_id, context: ContextTypes.DEFAULT_TYPE, extra_text=""):
-    """Exibe a lista de templates do canal"""
-    mensagem = extra_text or "📝 <b>Gerenciar Templates</b>\n\n"
+_ICONES_ESTILO = {"primary": "🔵", "success": "🟢", "danger": "🔴", "default": "⚪"}
+
+# Limite de cada cache de render por template, o mesmo do cache de templates do db_helpers
+_RENDER_CACHE_MAX = 256
+
+def _guardar_render(cache, template_id, valor):
+    """Guarda um render por template, descartando o mais antigo quando o cache está cheio"""
+    if template_id not in cache and len(cache) >= _RENDER_CACHE_MAX:
+        cache.pop(next(iter(cache)))
+    cache[template_id] = valor
+
+# template_id -> (dict do template, linhas); o dict vem do cache do db_helpers e é trocado quando recarregado
+_linhas_lista_cache = {}
+
+def _linhas_template(template):
+    """Duas linhas de botões de um template na lista (editar/preview e deletar), reaproveitadas enquanto o dict for o mesmo"""
+    tid = template['id']
+    cached = _linhas_lista_cache.get(tid)
+    if cached and cached[0] is template:
+        return cached[1]
+    clean_msg = strip_html_tags(template['template_mensagem'])
+    preview = encurtar(clean_msg, 28)
+    linhas = (
+        (
+            InlineKeyboardButton(f"📄 {preview}", callback_data=f"edit_template_{tid}"),
+            InlineKeyboardButton("👁️ Preview", callback_data=f"preview_template_{tid}")
+        ),
+        (InlineKeyboardButton("🗑️ Deletar", callback_data=f"deletar_template_{tid}"),),
+    )
+    _guardar_render(_linhas_lista_cache, tid, (template, linhas))
+    return linhas
+
+# canal_id -> (lista de templates, markup); a lista vem do cache do db_helpers e só muda de identidade quando é recarregada
+_markup_lista_cache = {}
+
+def _markup_lista_templates(templates, canal_id):
+    """Teclado da lista de templates, reaproveitado enquanto a lista do canal for a mesma"""
+    cached = _markup_lista_cache.get(canal_id)
+    if cached and cached[0] is templates:
+        return cached[1]
     if not templates:
         keyboard = [
             [InlineKeyboardButton("➕ Adicionar Template", callback_data=f"adicionar_template_{canal_id}")],
-            [InlineKeyboardButton("⬅️ Voltar", callback_data="edit_voltar")]
+            [BOTAO_VOLTAR_EDICAO]
         ]
-        mensagem += "❌ Nenhum template encontrado."
     else:
-        mensagem += f"Total: {len(templates)} template(s)\n\n"
-        keyboard = []
-        for template in templates:
-            tid = template['id']
-            msg = template['template_mensagem']
-            clean_msg = strip_html_tags(msg)
-            preview = clean_msg[:25] + "..." if len(clean_msg) > 25 else clean_msg
-            keyboard.append([
-                InlineKeyboardButton(f"📄 {preview}", callback_data=f"edit_template_{tid}"),
-                InlineKeyboardButton("👁️ Preview", callback_data=f"preview_template_{tid}")
-            ])
-            keyboard.append([
-                InlineKeyboardButton("🗑️ Deletar", callback_data=f"deletar_template_{tid}")
-            ])
-        
-        keyboard.append([InlineKeyboardButton("➕ Adicionar Template", callback_data=f"adicionar_template_{canal_id}")])
-        keyboard.append([InlineKeyboardButton("🔗 Mudar link geral", callback_data=f"mudar_link_geral_canal_{canal_id}")])
-        keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data="edit_voltar")])
+        keyboard = [linha for template in templates for linha in _linhas_template(template)]
+        keyboard += [
+            [InlineKeyboardButton("➕ Adicionar Template", callback_data=f"adicionar_template_{canal_id}")],
+            [InlineKeyboardButton("🔗 Mudar link geral", callback_data=f"mudar_link_geral_canal_{canal_id}")],
+            [BOTAO_VOLTAR_EDICAO],
+        ]
+    markup = InlineKeyboardMarkup(keyboard)
+    _markup_lista_cache[canal_id] = (templates, markup)
+    return markup
 
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    if isinstance(obj, CallbackQuery):
-        await obj.edit_message_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
+async def mostrar_lista_templates(obj, templates, canal_id, context: ContextTypes.DEFAULT_TYPE, extra_text=""):
+    """Exibe a lista de templates do canal"""
+    cabecalho = extra_text or "📝 <b>Gerenciar Templates</b>\n\n"
+    if not templates:
+        mensagem = f"{cabecalho}❌ Nenhum template encontrado."
     else:
-        await obj.reply_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
+        mensagem = f"{cabecalho}Total: {len(templates)} template(s)\n\n"
+
+    reply_markup = _markup_lista_templates(templates, canal_id)
+    await responder(obj, mensagem, reply_markup)
+
+@lru_cache(maxsize=512)
+def _formatar_preview(parser, template_mensagem, links_key):
+    """Mensagem formatada do preview; texto e links fazem parte da chave, então uma edição gera outra entrada"""
+    return parser.format_message_with_links(template_mensagem, list(links_key))
 
 async def mostrar_preview_template(obj, template, global_buttons, parser, context: ContextTypes.DEFAULT_TYPE):
     """Mostra o preview formatado de um template"""
@@ -44,35 +82,29 @@ async def mostrar_preview_template(obj, template, global_buttons, parser, contex
     links = template['links']
     inline_buttons = template.get('inline_buttons', [])
     
-    links_tuples = [(link['segmento'], link['link']) for link in links]
-    formatted_message = parser.format_message_with_links(template_mensagem, links_tuples)
+    links_key = tuple((link['segmento'], link['link']) for link in links)
+    formatted_message = _formatar_preview(parser, template_mensagem, links_key)
     
-    preview_text = f"👁️ <b>Preview - Template ID: {template_id}</b>\n\n"
-    preview_text += f"📄 <b>Mensagem formatada:</b>\n\n"
-    preview_text += formatted_message
+    parts = [
+        f"👁️ <b>Preview - Template ID: {template_id}</b>\n\n",
+        "📄 <b>Mensagem formatada:</b>\n\n",
+        formatted_message,
+    ]
     
     preview_keyboard = []
     all_buttons = []
     
-    style_map = {"primary": "🔵", "success": "🟢", "danger": "🔴", "default": "⚪"}
-    
-    if global_buttons:
-        preview_text += f"\n\n🔘 <b>Botões Globais ({len(global_buttons)}):</b>\n"
-        for button in global_buttons:
-            style_icon = style_map.get(button.get('style'), "⚪")
-            preview_text += f"• {style_icon} {button['text']} → {button['url'][:30]}...\n"
-            all_buttons.append(InlineKeyboardButton(
-                button['text'], 
-                url=button['url'], 
-                icon_custom_emoji_id=button.get('icon_emoji_id'),
-                style=button.get('style')
-            ))
-    
-    if inline_buttons:
-        preview_text += f"\n🔘 <b>Botões do Template ({len(inline_buttons)}):</b>\n"
-        for button in inline_buttons:
-            style_icon = style_map.get(button.get('style'), "⚪")
-            preview_text += f"• {style_icon} {button['text']} → {button['url'][:30]}...\n"
+    secoes = (
+        (global_buttons, "\n\n🔘 <b>Botões Globais ({}):</b>\n"),
+        (inline_buttons, "\n🔘 <b>Botões do Template ({}):</b>\n"),
+    )
+    for buttons, titulo in secoes:
+        if not buttons:
+            continue
+        parts.append(titulo.format(len(buttons)))
+        for button in buttons:
+            style_icon = _ICONES_ESTILO.get(button.get('style'), "⚪")
+            parts.append(f"• {style_icon} {button['text']} → {encurtar(button['url'], 33)}\n")
             all_buttons.append(InlineKeyboardButton(
                 button['text'], 
                 url=button['url'], 
@@ -89,57 +121,95 @@ async def mostrar_preview_template(obj, template, global_buttons, parser, contex
         if row: preview_keyboard.append(row)
         
     preview_keyboard.append([
-        InlineKeyboardButton("⬅️ Voltar", callback_data="edit_templates"),
+        BOTAO_VOLTAR_TEMPLATES,
         InlineKeyboardButton("✏️ Editar", callback_data=f"edit_template_{template_id}")
     ])
     
+    preview_text = "".join(parts)
     reply_markup = InlineKeyboardMarkup(preview_keyboard)
-    if isinstance(obj, CallbackQuery):
-        await obj.edit_message_text(preview_text, reply_markup=reply_markup, parse_mode='HTML')
-    else:
-        await obj.reply_text(preview_text, reply_markup=reply_markup, parse_mode='HTML')
+    await responder(obj, preview_text, reply_markup)
+
+_LINHA_VOLTAR_TEMPLATES = (BOTAO_VOLTAR_TEMPLATES,)
+
+@lru_cache(maxsize=256)
+def _linhas_navegacao_links(template_id):
+    """Linhas fixas do rodapé do painel de links (dependem só do template_id)"""
+    return (
+        (InlineKeyboardButton("🔘 Gerenciar Botões do Template (Fixos)", callback_data=f"fix_button_tg_list_{template_id}"),),
+        (InlineKeyboardButton("🔄 Mudar Todos os Links", callback_data=f"ea:{template_id}"),),
+        _LINHA_VOLTAR_TEMPLATES,
+    )
+
+# template_id -> (dict do template, render); o dict vem do cache de get_template_with_link_ids
+_links_render_cache = {}
+
+def _render_links(template):
+    """Texto e linhas de botões dos segmentos, reaproveitados enquanto o dict do template for o mesmo"""
+    template_id = template['id']
+    cached = _links_render_cache.get(template_id)
+    if cached and cached[0] is template:
+        return cached[1]
+    links = template['links']
+    clean_t_msg = strip_html_tags(template['template_mensagem'])
+    preview = encurtar(clean_t_msg, 103)
+    parts = [
+        "📄 <b>Texto:</b>\n",
+        f"<i>{preview}</i>\n\n",
+        f"🔗 <b>Segmentos identificados ({len(links)}):</b>\n",
+    ]
+    botoes = []
+    for link_id, segmento, url, ordem in links:
+        url_display = encurtar(url, 30)
+        parts.append(f"{ordem}. '{segmento}'\n   → {url_display}\n\n")
+        botoes.append([InlineKeyboardButton(f"✏️ Editar {ordem}", callback_data=f"el:{link_id}")])
+    render = ("".join(parts), tuple(botoes))
+    _guardar_render(_links_render_cache, template_id, (template, render))
+    return render
+
+# template_id -> (lista de botões inline, render); a lista é a do dict cacheado do template
+_botoes_render_cache = {}
+
+def _render_botoes_inline(template, inline_buttons):
+    """Texto e linhas dos botões inline, reaproveitados enquanto a lista recebida for a mesma"""
+    template_id = template['id']
+    cached = _botoes_render_cache.get(template_id)
+    if cached and cached[0] is inline_buttons:
+        return cached[1]
+    parts = ["\n🔘 <b>Botões Inline:</b>\n"] if inline_buttons else []
+    botoes = []
+    for i, button in enumerate(inline_buttons, 1):
+        status_icon = "🟢" if button.get('status') == "ATIVO" else "🔴"
+        parts.append(f"{i}. '{button['text']}' ({status_icon}) → {encurtar(button['url'], 30)}\n")
+        botoes.append((
+            InlineKeyboardButton(f"✏️ Botão {i}", callback_data=f"fix_button_tg_edit_{button['id']}"),
+            InlineKeyboardButton("🗑️", callback_data=f"fix_button_tg_del_{button['id']}")
+        ))
+    render = ("".join(parts), tuple(botoes))
+    _guardar_render(_botoes_render_cache, template_id, (inline_buttons, render))
+    return render
+
+def descartar_renders_template(template_id):
+    """Descarta os renders em cache de um template deletado"""
+    _links_render_cache.pop(template_id, None)
+    _linhas_lista_cache.pop(template_id, None)
+    _botoes_render_cache.pop(template_id, None)
 
 async def mostrar_painel_edicao_links(obj, template, inline_buttons, context: ContextTypes.DEFAULT_TYPE, success_message=""):
     """Mostra o painel de edição de links de um template"""
     template_id = template['id']
-    links = template['links']
     
-    mensagem = f"🔧 <b>Configuração de Links - ID: {template_id}</b>\n\n"
-    if success_message: mensagem += f"{success_message}\n\n"
+    parts = [f"🔧 <b>Configuração de Links - ID: {template_id}</b>\n\n"]
+    if success_message: parts.append(f"{success_message}\n\n")
         
-    mensagem += "📄 <b>Texto:</b>\n"
-    t_msg = template['template_mensagem']
-    clean_t_msg = strip_html_tags(t_msg)
-    preview = clean_t_msg[:100] + "..." if len(clean_t_msg) > 100 else clean_t_msg
-    mensagem += f"<i>{preview}</i>\n\n"
-    mensagem += f"🔗 <b>Segmentos identificados ({len(links)}):</b>\n"
-    
-    keyboard = []
-    for link_id, segmento, url, ordem in links:
-        url_display = url if len(url) <= 30 else url[:27] + "..."
-        mensagem += f"{ordem}. '{segmento}'\n   → {url_display}\n\n"
-        keyboard.append([InlineKeyboardButton(f"✏️ Editar {ordem}", callback_data=f"edit_link_{link_id}")])
-    
-    if inline_buttons:
-        mensagem += "\n🔘 <b>Botões Inline:</b>\n"
-        for i, button in enumerate(inline_buttons, 1):
-            url_display = button['url'] if len(button['url']) <= 30 else button['url'][:27] + "..."
-            status_icon = "🟢" if button.get('status') == "ATIVO" else "🔴"
-            mensagem += f"{i}. '{button['text']}' ({status_icon}) → {url_display}\n"
-            keyboard.append([
-                InlineKeyboardButton(f"✏️ Botão {i}", callback_data=f"fix_button_tg_edit_{button['id']}"),
-                InlineKeyboardButton("🗑️", callback_data=f"fix_button_tg_del_{button['id']}")
-            ])
-            
-    keyboard.append([InlineKeyboardButton("🔘 Gerenciar Botões do Template (Fixos)", callback_data=f"fix_button_tg_list_{template_id}")])
-    keyboard.append([InlineKeyboardButton("🔄 Mudar Todos os Links", callback_data=f"edit_all_{template_id}")])
-    keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data="edit_templates")])
+    texto_links, botoes_links = _render_links(template)
+    texto_botoes, botoes_inline = _render_botoes_inline(template, inline_buttons or [])
+    parts.append(texto_links)
+    parts.append(texto_botoes)
+    keyboard = [*botoes_links, *botoes_inline, *_linhas_navegacao_links(template_id)]
     
+    mensagem = "".join(parts)
     reply_markup = InlineKeyboardMarkup(keyboard)
-    if isinstance(obj, CallbackQuery):
-        await obj.edit_message_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
-    else:
-        await obj.reply_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
+    await responder(obj, mensagem, reply_markup)
 
 async def mostrar_confirmacao_delecao(query, template_id, preview_msg):
     """Mostra o menu de confirmação de deleção"""
@@ -148,7 +218,7 @@ async def mostrar_confirmacao_delecao(query, template_id, preview_msg):
         InlineKeyboardButton("✅ Confirmar", callback_data=f"confirmar_deletar_template_{template_id}"),
         InlineKeyboardButton("❌ Cancelar", callback_data="edit_templates")
     ]]
-    await query.edit_message_text(mensagem, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+    await query.edit_message_text(mensagem, reply_markup=InlineKeyboardMarkup(keyboard))
 
 async def mostrar_menu_tipo_link_geral(query, canal_id, num_templates):
     """Mostra opções para mudar links em todo o canal"""
@@ -159,9 +229,9 @@ async def mostrar_menu_tipo_link_geral(query, canal_id, num_templates):
         [InlineKeyboardButton("🌐 Link global", callback_data=f"mudar_link_global_canal_{canal_id}")],
         [InlineKeyboardButton("🤖 Link de bot", callback_data=f"mudar_link_bot_canal_{canal_id}")],
         [InlineKeyboardButton("🔗 Link externo", callback_data=f"mudar_link_externo_canal_{canal_id}")],
-        [InlineKeyboardButton("⬅️ Voltar", callback_data="edit_templates")]
+        [BOTAO_VOLTAR_TEMPLATES]
     ]
-    await query.edit_message_text(mensagem, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+    await query.edit_message_text(mensagem, reply_markup=InlineKeyboardMarkup(keyboard))
 
 async def mostrar_prompt_criacao_template(obj):
     """Prompt inicial para novo template"""
@@ -172,37 +242,33 @@ async def mostrar_prompt_criacao_template(obj):
         "• Use <b>Inserir Link</b> (hiperlink) no próprio texto.\n\n"
         "O bot identificará todos os links e a formatação automaticamente! ✅"
     )
-    if isinstance(obj, CallbackQuery):
-        await obj.edit_message_text(mensagem, parse_mode='HTML')
-    else:
-        await obj.reply_text(mensagem, parse_mode='HTML')
+    await responder(obj, mensagem)
+
+_TECLADO_ESCOLHA_LINK = InlineKeyboardMarkup([
+    [InlineKeyboardButton("✅ Manter Originais", callback_data="link_choice_keep")],
+    [InlineKeyboardButton("🔗 Mesmo link para todos", callback_data="link_choice_same")],
+    [InlineKeyboardButton("🔗 Separados", callback_data="link_choice_separate")]
+])
+_TECLADO_SALVAR_ESTATICO = InlineKeyboardMarkup([[InlineKeyboardButton("✅ Salvar", callback_data="confirmar_salvar_estatico")]])
 
 async def mostrar_escolha_link_template(message, num_links):
     """Pergunta o que fazer com os links encontrados"""
-    keyboard = [
-        [InlineKeyboardButton("✅ Manter Originais", callback_data="link_choice_keep")],
-        [InlineKeyboardButton("🔗 Mesmo link para todos", callback_data="link_choice_same")],
-        [InlineKeyboardButton("🔗 Separados", callback_data="link_choice_separate")]
-    ]
     await message.reply_text(
         f"✅ Localizei {num_links} links. O que deseja fazer?",
-        reply_markup=InlineKeyboardMarkup(keyboard),
-        parse_mode='HTML'
+        reply_markup=_TECLADO_ESCOLHA_LINK
     )
 
 async def mostrar_prompt_link_estatico(message):
     """Prompt para template sem links"""
-    keyboard = [[InlineKeyboardButton("✅ Salvar", callback_data="confirmar_salvar_estatico")]]
     await message.reply_text(
         "📝 Template estático detectado (sem links dinâmicos). Salvar?",
-        reply_markup=InlineKeyboardMarkup(keyboard),
-        parse_mode='HTML'
+        reply_markup=_TECLADO_SALVAR_ESTATICO
     )
 
 async def mostrar_prompt_edicao_global(query, num_links):
     """Prompt para edição de todos os links de um template"""
     mensagem = f"🔗 <b>Edição Global</b>\n\nEnvie o novo URL que substituirá todos os {num_links} segmentos:"
-    await query.edit_message_text(mensagem, parse_mode='HTML')
+    await query.edit_message_text(mensagem)
 
 async def mostrar_prompt_mudar_link_canal(query, tipo):
     """Prompts para mudança de link em todo o canal"""
@@ -211,12 +277,9 @@ async def mostrar_prompt_mudar_link_canal(query, tipo):
         'bot': "🤖 <b>Link de Bot do Canal</b>\n\nEnvie o novo link do bot (ex: https://t.me/meubot):",
         'externo': "🔗 <b>Link Externo do Canal</b>\n\nEnvie o novo link que substituirá os links externos:"
     }
-    await query.edit_message_text(prompts.get(tipo, "Envie o novo link:"), parse_mode='HTML')
+    await query.edit_message_text(prompts.get(tipo, "Envie o novo link:"))
 
 async def mostrar_erro_template(obj, erro="Template não encontrado."):
     """Função genérica para exibir erros de template"""
     mensagem = f"❌ {erro}"
-    if isinstance(obj, CallbackQuery):
-        await obj.edit_message_text(mensagem, parse_mode='HTML')
-    else:
-        await obj.reply_text(mensagem, parse_mode='HTML')
+    await responder(obj, mensagem)
@@ -1,61 +1,97 @@
-import re
+import bisect
+from functools import lru_cache
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from modules.utils import callback_com_id, responder, SESSAO_VAZIA, BOTAO_VOLTAR_EDICAO
 
-def validar_horario(h):
-    """Valida formato de horário (HH:MM em 24h)"""
-    return bool(re.match(r'^([01]\d|2[0-3]):([0-5]\d)$', h))
-
-async def mostrar_painel_horarios(obj, context, is_edicao=False, extra_text=""):
-    """
-    Função unificada para mostrar o painel de horários.
-    obj: Pode ser um CallbackQuery ou Message
-    """
-    if is_edicao:
-        dados = context.user_data.get('editando', {})
-        horarios = dados.get('horarios', [])
-        prefix = "edit_"
-    else:
-        horarios = context.user_data.get('horarios', [])
-        prefix = ""
-
-    mensagem = extra_text or "🕒 <b>Gerenciar Horários</b>\n\n"
-    if extra_text and "Horários" not in extra_text:
-        mensagem += "🕒 <b>Gerenciar Horários</b>\n\n"
-    
-    if horarios:
-        mensagem += "<b>Horários configurados:</b>\n"
-        for i, horario in enumerate(sorted(horarios), 1):
-            mensagem += f"{i}. <code>{horario}</code>\n"
-    else:
-        mensagem += "❌ Nenhum horário configurado\n"
-    
-    mensagem += f"\nTotal: {len(horarios)} horário(s)"
-    
+def _montar_teclado_horarios(is_edicao, tem_horarios):
+    """Monta o teclado do painel de horários (criação ou edição)"""
     # Callbacks mudam dependendo do contexto (criação vs edição)
+    prefix = "edit_" if is_edicao else ""
     keyboard = [
         [
             InlineKeyboardButton("➕ Adicionar Horário", callback_data=f"{prefix}adicionar_horario"),
         ],
     ]
     
-    if horarios:
+    if tem_horarios:
         keyboard.append([
             InlineKeyboardButton("🗑 Remover Horário", callback_data=f"{prefix}remover_horario"),
         ])
     
     # No fluxo de criação o botão é 'Confirmar', na edição é 'Voltar' (pois o salvar é global)
     if is_edicao:
-        keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data="edit_voltar")])
+        keyboard.append([BOTAO_VOLTAR_EDICAO])
     else:
         keyboard.append([InlineKeyboardButton("✅ Confirmar", callback_data="confirmar_horarios")])
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    return InlineKeyboardMarkup(keyboard)
+
+# Os quatro layouts possíveis são fixos: (is_edicao, tem_horarios) -> teclado
+_TECLADOS_HORARIOS = {
+    (is_edicao, tem_horarios): _montar_teclado_horarios(is_edicao, tem_horarios)
+    for is_edicao in (False, True) for tem_horarios in (False, True)
+}
+
+@lru_cache(maxsize=2048)
+def validar_horario(h):
+    """Valida formato de horário (HH:MM em 24h)"""
+    if len(h) != 5 or h[2] != ':':
+        return False
+    h0, h1, _, m0, m1 = h
+    # Comparações de caractere: só aceita dígitos ASCII, sem passar pelo motor de regex
+    hora_ok = ('0' <= h0 <= '1' and '0' <= h1 <= '9') or (h0 == '2' and '0' <= h1 <= '3')
+    return hora_ok and '0' <= m0 <= '5' and '0' <= m1 <= '9'
+
+def separar_horarios(texto):
+    """Tokens não vazios de uma lista de horários separada por vírgulas, cada um com strip feito uma vez"""
+    return [h for h in map(str.strip, texto.split(",")) if h]
+
+def inserir_horarios(atuais, novos):
+    """Insere em ordem os horários novos ainda ausentes; retorna os que foram adicionados"""
+    adicionados = [h for h in dict.fromkeys(novos) if h not in atuais]
+    for h in adicionados:
+        bisect.insort(atuais, h)
+    return adicionados
+
+_CABECALHO_HORARIOS = "🕒 <b>Gerenciar Horários</b>\n\n"
+_LISTA_HORARIOS = "<b>Horários configurados:</b>\n"
+_SEM_HORARIOS = "❌ Nenhum horário configurado\n"
+_LINHA_HORARIO_TMPL = "{}. <code>{}</code>\n"
+_TOTAL_HORARIOS_TMPL = "\nTotal: {} horário(s)"
+
+def montar_painel_horarios(horarios, is_edicao=False, extra_text=""):
+    """Monta (mensagem, reply_markup) do painel de horários"""
+    parts = [extra_text]
+    if not extra_text or "Horários" not in extra_text:
+        parts.append(_CABECALHO_HORARIOS)
     
-    from telegram import CallbackQuery
+    if horarios:
+        # A lista é mantida ordenada na inserção (bisect.insort)
+        parts.append(_LISTA_HORARIOS)
+        parts.extend(_LINHA_HORARIO_TMPL.format(i, horario) for i, horario in enumerate(horarios, 1))
+    else:
+        parts.append(_SEM_HORARIOS)
+    parts.append(_TOTAL_HORARIOS_TMPL.format(len(horarios)))
     
-    if isinstance(obj, CallbackQuery):
-        await obj.edit_message_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
+    return "".join(parts), _TECLADOS_HORARIOS[(is_edicao, bool(horarios))]
+
+def montar_teclado_remocao(itens, callback_prefix, voltar_callback):
+    """Teclado com um botão por item (callback = prefixo + índice) e o botão de voltar"""
+    keyboard = [[InlineKeyboardButton(f"❌ {item}", callback_data=callback_com_id(callback_prefix, i))] for i, item in enumerate(itens)]
+    keyboard.append([InlineKeyboardButton("⬅️ Voltar", callback_data=voltar_callback)])
+    return InlineKeyboardMarkup(keyboard)
+
+async def mostrar_painel_horarios(obj, context, is_edicao=False, extra_text=""):
+    """
+    Função unificada para mostrar o painel de horários.
+    obj: Pode ser um CallbackQuery ou Message
+    """
+    if is_edicao:
+        dados = context.user_data.get('editando', SESSAO_VAZIA)
+        horarios = dados.get('horarios', ())
     else:
-        # Se for Message (seja do usuário ou do bot), usamos reply_text para garantir nova mensagem
-        # ou poderíamos tentar edit_text se fosse do bot, mas reply_text é mais seguro para o fluxo planejado
-        await obj.reply_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
+        horarios = context.user_data.get('horarios', [])
+
+    mensagem, reply_markup = montar_painel_horarios(horarios, is_edicao, extra_text)
+    
+    await responder(obj, mensagem, reply_markup)
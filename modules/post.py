@@ -216,10 +216,10 @@ class MediaScheduler:
             if not template:
                 template = await self.media_handler.get_auto_template(group)
 
-            success_count = 0
-            for telegram_id in canal_data['ids']:
-                try:
-                    success = await self.media_handler.send_media_group_with_template(
+            # Envia para todos os IDs em paralelo (latência ~ max(RTT) em vez da soma)
+            resultados = await asyncio.gather(
+                *(
+                    self.media_handler.send_media_group_with_template(
                         context=None,
                         chat_id=telegram_id,
                         media_group=group,
@@ -228,10 +228,17 @@ class MediaScheduler:
                         use_auto_template=True,
                         bot=self.bot
                     )
-                    if success:
-                        success_count += 1
-                except Exception as e:
-                    logger.error(f"Erro ao enviar para {telegram_id}: {e}")
+                    for telegram_id in canal_data['ids']
+                ),
+                return_exceptions=True
+            )
+
+            success_count = 0
+            for telegram_id, resultado in zip(canal_data['ids'], resultados):
+                if isinstance(resultado, Exception):
+                    logger.error(f"Erro ao enviar para {telegram_id}: {resultado}")
+                elif resultado:
+                    success_count += 1
 
             return success_count > 0
         except Exception as e:
@@ -1,100 +1,80 @@
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+import html
+from functools import lru_cache
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from modules.utils import is_super_admin
+from modules.utils import is_super_admin, editar_mensagem, responder, SESSAO_VAZIA
+
+_MSG_MENU_INICIAL = "🤖 <b>Bot de Postagens canais</b>\n\nEscolha uma opção:"
+_CABECALHO_EDICAO_TMPL = "🔧 <b>Menu de Edição</b>\n\n📢 <b>Nome:</b> {}\n"
+_CANAL_EDICAO_TMPL = "📢 Canal: <b>{}</b>\n"
+_RESUMO_EDICAO_TMPL = "🆔 <b>IDs:</b> {} ID(s)\n🕒 <b>Horários:</b> {} horário(s)\n\nEscolha o que deseja editar:"
+_LINHAS_MENU_ADMIN = (
+    (InlineKeyboardButton("📢 Criar Canal", callback_data="criar_canal"),),
+    (InlineKeyboardButton("✏️ Editar Canal", callback_data="editar_canal"),),
+)
+_TECLADO_INICIAL = InlineKeyboardMarkup(_LINHAS_MENU_ADMIN)
+_TECLADO_INICIAL_SUPER = InlineKeyboardMarkup(_LINHAS_MENU_ADMIN + (
+    (InlineKeyboardButton("👥 Gerenciar Admins", callback_data="gerenciar_admins"),),
+    (InlineKeyboardButton("📊 Painel de Controle", callback_data="painel_controle"),),
+))
 
 def get_main_keyboard(user_id: int):
-    """Gera o teclado principal baseado no nível de acesso"""
-    keyboard = [
-        [InlineKeyboardButton("📢 Criar Canal", callback_data="criar_canal")],
-        [InlineKeyboardButton("✏️ Editar Canal", callback_data="editar_canal")]
-    ]
-    if is_super_admin(user_id):
-        keyboard.append([InlineKeyboardButton("👥 Gerenciar Admins", callback_data="gerenciar_admins")])
-        keyboard.append([InlineKeyboardButton("📊 Painel de Controle", callback_data="painel_controle")])
-    return keyboard
+    """Retorna o teclado principal (pré-montado) baseado no nível de acesso"""
+    return _TECLADO_INICIAL_SUPER if is_super_admin(user_id) else _TECLADO_INICIAL
 
 async def mostrar_menu_inicial_query(query, user_id: int):
     """Versão do menu inicial para CallbackQuery"""
-    keyboard = get_main_keyboard(user_id)
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(
-        "🤖 <b>Bot de Postagens canais</b>\n\nEscolha uma opção:",
-        reply_markup=reply_markup,
-        parse_mode='HTML'
-    )
+    await editar_mensagem(query, _MSG_MENU_INICIAL, get_main_keyboard(user_id))
 
 async def mostrar_menu_inicial_msg(message, user_id: int):
     """Versão do menu inicial para Message"""
-    keyboard = get_main_keyboard(user_id)
-    reply_markup = InlineKeyboardMarkup(keyboard)
     await message.reply_text(
-        "🤖 <b>Bot de Postagens canais</b>\n\nEscolha uma opção:",
-        reply_markup=reply_markup,
-        parse_mode='HTML'
+        _MSG_MENU_INICIAL,
+        reply_markup=get_main_keyboard(user_id)
+    )
+
+# Linhas do menu de edição que não dependem do canal, compartilhadas por todos os teclados
+_LINHAS_EDICAO_TOPO = (
+    (InlineKeyboardButton("📛 Editar Nome", callback_data="edit_nome"),),
+    (InlineKeyboardButton("🆔 Gerenciar IDs", callback_data="edit_ids"),),
+    (InlineKeyboardButton("🕒 Gerenciar Horários", callback_data="edit_horarios_menu"),),
+    (InlineKeyboardButton("📝 Gerenciar Templates", callback_data="edit_templates"),),
+)
+_LINHAS_EDICAO_MEIO = (
+    (InlineKeyboardButton("📸 Gerenciar Mídias", callback_data="edit_medias"),),
+    (InlineKeyboardButton("🗑️ Deletar Canal", callback_data="edit_deletar_canal"),),
+)
+_LINHA_SALVAR_EDICAO = (InlineKeyboardButton("✅ Salvar Alterações", callback_data="edit_salvar"),)
+_LINHA_SAIR_EDICAO = (
+    InlineKeyboardButton("⬅️ Voltar", callback_data="editar_canal"),
+    InlineKeyboardButton("✖️ Cancelar", callback_data="edit_cancelar"),
+)
+
+@lru_cache(maxsize=256)
+def _teclado_edicao(canal_id, changes_made):
+    """Teclado do menu de edição; só varia pelo canal e pelo botão de salvar"""
+    linha_globais = (InlineKeyboardButton("🔘 Botões Globais", callback_data=f"global_button_tg_list_{canal_id}"),)
+    linha_salvar = (_LINHA_SALVAR_EDICAO,) if changes_made else ()
+    return InlineKeyboardMarkup(
+        _LINHAS_EDICAO_TOPO + (linha_globais,) + _LINHAS_EDICAO_MEIO + linha_salvar + (_LINHA_SAIR_EDICAO,)
     )
 
 async def mostrar_menu_edicao(obj, context: ContextTypes.DEFAULT_TYPE, extra_text=""):
     """Mostra o menu principal de edição. obj pode ser Query ou Message."""
-    dados = context.user_data.get('editando', {})
+    dados = context.user_data.get('editando', SESSAO_VAZIA)
     
     if not dados:
-        if hasattr(obj, 'edit_message_text'):
-            await obj.edit_message_text("❌ Erro: dados de edição não encontrados.", parse_mode='HTML')
-        else:
-            await obj.reply_text("❌ Erro: dados de edição não encontrados.", parse_mode='HTML')
+        await responder(obj, "❌ Erro: dados de edição não encontrados.")
         return
     
-    import html
-    mensagem = extra_text or "🔧 <b>Menu de Edição</b>\n\n"
-    if not extra_text:
-        mensagem += f"📢 <b>Nome:</b> {html.escape(dados['nome'])}\n"
+    nome = html.escape(dados['nome'])
+    if extra_text:
+        # Se tem texto extra (ex: sucesso), adicionamos info compacta do canal
+        cabecalho = extra_text + _CANAL_EDICAO_TMPL.format(nome)
     else:
-        # Se tem texto extra (ex: sucesso), o nome já está lá ou adicionamos info compacta
-        mensagem += f"📢 Canal: <b>{html.escape(dados['nome'])}</b>\n"
-        
-    mensagem += f"🆔 <b>IDs:</b> {len(dados['ids'])} ID(s)\n"
-    mensagem += f"🕒 <b>Horários:</b> {len(dados['horarios'])} horário(s)\n\n"
-    mensagem += "Escolha o que deseja editar:"
+        cabecalho = _CABECALHO_EDICAO_TMPL.format(nome)
+    mensagem = cabecalho + _RESUMO_EDICAO_TMPL.format(len(dados['ids']), len(dados['horarios']))
     
-    keyboard = [
-        [
-            InlineKeyboardButton("📛 Editar Nome", callback_data="edit_nome"),
-        ],
-        [
-            InlineKeyboardButton("🆔 Gerenciar IDs", callback_data="edit_ids"),
-        ],
-        [
-            InlineKeyboardButton("🕒 Gerenciar Horários", callback_data="edit_horarios_menu"),
-        ],
-        [
-            InlineKeyboardButton("📝 Gerenciar Templates", callback_data="edit_templates"),
-        ],
-        [
-            InlineKeyboardButton("🔘 Botões Globais", callback_data=f"global_button_tg_list_{dados.get('canal_id')}"),
-        ],
-        [
-            InlineKeyboardButton("📸 Gerenciar Mídias", callback_data="edit_medias"),
-        ],
-        [
-            InlineKeyboardButton("🗑️ Deletar Canal", callback_data="edit_deletar_canal"),
-        ],
-    ]
+    reply_markup = _teclado_edicao(dados['canal_id'], dados['changes_made'])
     
-    if dados.get('changes_made', False):
-        keyboard.append([
-            InlineKeyboardButton("✅ Salvar Alterações", callback_data="edit_salvar"),
-        ])
-    
-    keyboard.append([
-        InlineKeyboardButton("⬅️ Voltar", callback_data="editar_canal"),
-        InlineKeyboardButton("✖️ Cancelar", callback_data="edit_cancelar"),
-    ])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    from telegram import CallbackQuery
-    
-    if isinstance(obj, CallbackQuery):
-        await obj.edit_message_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
-    else:
-        await obj.reply_text(mensagem, reply_markup=reply_markup, parse_mode='HTML')
+    await responder(obj, mensagem, reply_markup)
@@ -1,11 +1,17 @@
 import os
+import sys
+import time
+import asyncio
 import logging
 from datetime import datetime
 import re
-from functools import wraps
-from telegram import Update
+from collections import defaultdict, OrderedDict
+from functools import lru_cache, wraps
+from types import MappingProxyType
+from telegram import Update, InlineKeyboardButton, CallbackQuery
+from telegram.error import BadRequest, TelegramError
 from telegram.ext import ContextTypes
-from db_helpers import is_admin_db
+from db_helpers import is_admin_db, get_all_admins
 
 logger = logging.getLogger(__name__)
 
@@ -19,11 +25,24 @@ else:
     except ValueError:
         SUPER_ADMIN_ID = None
 
+# Botões de navegação repetidos em vários menus; imutáveis, então uma instância serve a todos
+BOTAO_VOLTAR_INICIO = InlineKeyboardButton("⬅️ Voltar", callback_data="voltar_start")
+BOTAO_VOLTAR_EDICAO = InlineKeyboardButton("⬅️ Voltar", callback_data="edit_voltar")
+BOTAO_VOLTAR_TEMPLATES = InlineKeyboardButton("⬅️ Voltar", callback_data="edit_templates")
+
+# Default de user_data.get('editando', ...) nas leituras: um só objeto vazio e somente leitura
+SESSAO_VAZIA = MappingProxyType({})
+
+# URL aceita em links e botões: http(s) sem espaços nem sinais de tag
+_URL_RE = re.compile(r'^https?://[^\s<>]{3,2048}$')
+# Tags HTML simples, removidas em strip_html_tags
+_TAG_HTML_RE = re.compile('<.*?>')
+
 def is_super_admin(user_id: int) -> bool:
     """Verifica se o usuário é o super admin"""
     return user_id == SUPER_ADMIN_ID
 
-# Cache de admins (user_id: timestamp)
+# Cache de admins (user_id: (é_admin, timestamp)); o TTL vale só para respostas negativas
 _admin_cache = {}
 _cache_ttl = 300 # 5 minutos
 
@@ -35,13 +54,110 @@ async def is_admin(user_id: int) -> bool:
     now = datetime.now().timestamp()
     if user_id in _admin_cache:
         cached_val, ts = _admin_cache[user_id]
-        if now - ts < _cache_ttl:
+        # Positivos não expiram: add/remove de admin já chamam invalidar_cache_admin
+        if cached_val or now - ts < _cache_ttl:
             return cached_val
             
     res = await is_admin_db(user_id)
     _admin_cache[user_id] = (res, now)
     return res
 
+async def precarregar_admins():
+    """Preenche o cache com os admins cadastrados, para que o primeiro update de cada um não vá ao banco"""
+    now = datetime.now().timestamp()
+    for admin in await get_all_admins():
+        _admin_cache[admin['user_id']] = (True, now)
+
+def invalidar_cache_admin(user_id: int):
+    """Descarta o status de admin em cache após adicionar ou remover o usuário"""
+    _admin_cache.pop(user_id, None)
+
+# Cache de get_chat (chat_id: (chat, timestamp))
+_chat_cache = {}
+_chat_cache_ttl = 300 # 5 minutos
+
+async def get_chat_cached(bot, chat_id: int):
+    """Busca um chat no Telegram reaproveitando o resultado por alguns minutos"""
+    now = time.monotonic()
+    cached = _chat_cache.get(chat_id)
+    if cached and now - cached[1] < _chat_cache_ttl:
+        return cached[0]
+    
+    chat = await bot.get_chat(chat_id)
+    _chat_cache[chat_id] = (chat, now)
+    return chat
+
+# Canais onde o bot já foi confirmado como admin (chat_id: timestamp)
+_bot_admin_cache = {}
+_bot_admin_cache_ttl = 60
+_STATUS_ADMIN = frozenset({'administrator', 'creator'})
+
+async def bot_e_admin(bot, chat_id: int) -> bool:
+    """Verifica se o bot é admin do chat; só a resposta positiva fica em cache, para que promover o bot surta efeito na hora"""
+    now = time.monotonic()
+    ts = _bot_admin_cache.get(chat_id)
+    if ts is not None and now - ts < _bot_admin_cache_ttl:
+        return True
+    
+    member = await bot.get_chat_member(chat_id=chat_id, user_id=bot.id)
+    if member.status in _STATUS_ADMIN:
+        _bot_admin_cache[chat_id] = now
+        return True
+    return False
+
+async def editar_mensagem(query, texto: str, reply_markup=None):
+    """Edita a mensagem do callback, pulando a chamada à API quando texto e teclado já são os atuais"""
+    atual = query.message
+    if atual is not None and atual.reply_markup == reply_markup and atual.text_html == texto:
+        return
+    try:
+        await query.edit_message_text(texto, reply_markup=reply_markup)
+    except BadRequest as e:
+        # O HTML renderizado pode diferir do enviado; o Telegram então responde "not modified"
+        if "not modified" not in str(e).lower():
+            raise
+
+# Tarefas de ack antecipado ainda em voo; a referência evita que sejam coletadas antes de terminar
+_acks_pendentes = set()
+
+def _ack_concluido(tarefa):
+    _acks_pendentes.discard(tarefa)
+    if not tarefa.cancelled() and tarefa.exception() is not None:
+        logger.warning(f"Falha ao confirmar callback: {tarefa.exception()}")
+
+def ack_antecipado(query, context):
+    """Dispara o ack vazio em paralelo com o trabalho do handler; o callback fica marcado como respondido"""
+    context.user_data['_callback_respondido'] = True
+    tarefa = asyncio.create_task(query.answer())
+    _acks_pendentes.add(tarefa)
+    tarefa.add_done_callback(_ack_concluido)
+
+async def avisar(query, context, texto: str, show_alert: bool = False):
+    """Responde o callback com um aviso e marca que o ack vazio do roteador não deve ser enviado"""
+    # O Telegram aceita uma única resposta por callback; rotas com aviso não levam o ack antecipado
+    if context.user_data.get('_callback_respondido'):
+        logger.warning(f"Aviso descartado, callback já respondido: {query.data}")
+        return
+    context.user_data['_callback_respondido'] = True
+    await query.answer(texto, show_alert=show_alert)
+
+async def confirmar_callback(query, context):
+    """Envia o ack vazio do callback, a menos que ele já tenha sido respondido (ack_antecipado ou avisar)"""
+    if context.user_data.pop('_callback_respondido', False):
+        return
+    try:
+        await query.answer()
+    except TelegramError as e:
+        # Não deve mascarar uma exceção do handler que já esteja em andamento
+        logger.warning(f"Falha ao confirmar callback: {e}")
+
+async def responder(obj, texto: str, reply_markup=None):
+    """Edita a mensagem quando obj é um CallbackQuery; senão responde com uma nova mensagem"""
+    if isinstance(obj, CallbackQuery):
+        await editar_mensagem(obj, texto, reply_markup)
+    else:
+        await obj.reply_text(texto, reply_markup=reply_markup)
+
 async def is_admin_only(user_id: int) -> bool:
     """Verifica se o usuário é apenas admin (não super admin)"""
     return await is_admin(user_id) and not is_super_admin(user_id)
@@ -84,10 +200,75 @@ def require_super_admin(func):
                 
     return wrapper
 
+# Um lock por usuário: com concurrent_updates, dois updates do mesmo usuário não intercalam sobre user_data
+_user_locks = defaultdict(asyncio.Lock)
+
+def serialize_per_user(func):
+    """Decorador que processa um update por vez para cada usuário (usuários diferentes seguem em paralelo)"""
+    @wraps(func)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
+        user = update.effective_user
+        if not user:
+            return await func(update, context, *args, **kwargs)
+        async with _user_locks[user.id]:
+            return await func(update, context, *args, **kwargs)
+    return wrapper
+
+# Cliques repetidos no mesmo botão: (user_id, message_id, data) -> instante do último clique (LRU)
+_ultimo_clique = OrderedDict()
+_ultimo_clique_max = 10000
+_intervalo_min_clique = 0.2
+
+def descartar_cliques_repetidos(func):
+    """Decorador que só responde o ack de cliques repetidos no mesmo botão em menos de 200 ms"""
+    @wraps(func)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
+        query = update.callback_query
+        if query and query.message:
+            chave = (query.from_user.id, query.message.message_id, query.data)
+            agora = time.monotonic()
+            anterior = _ultimo_clique.pop(chave, 0.0)
+            _ultimo_clique[chave] = agora
+            if len(_ultimo_clique) > _ultimo_clique_max:
+                _ultimo_clique.popitem(last=False)
+            if agora - anterior < _intervalo_min_clique:
+                await query.answer()
+                return
+        return await func(update, context, *args, **kwargs)
+    return wrapper
+
 def strip_html_tags(text: str) -> str:
     """Remove todas as tags HTML de uma string"""
     if not text:
         return ""
-    # Remove tags HTML simples
-    clean = re.compile('<.*?>')
-    return re.sub(clean, '', text)
+    return _TAG_HTML_RE.sub('', text)
+
+def encurtar(texto: str, limite: int) -> str:
+    """Corta o texto para caber em `limite` caracteres, reticências incluídas; textos curtos voltam sem cópia"""
+    return texto if len(texto) <= limite else texto[:limite - 3] + "..."
+
+def extrair_ids(texto: str) -> list:
+    """IDs numéricos separados por vírgula, espaço ou quebra de linha; ValueError se algum não for número"""
+    return [int(p) for p in texto.replace(',', ' ').split()]
+
+def validar_url(url: str) -> bool:
+    """Valida se o texto é uma URL http(s) sem espaços"""
+    return _URL_RE.match(url) is not None
+
+def limpar_chaves(user_data, chaves):
+    """Remove do user_data as chaves de um fluxo, presentes ou não"""
+    for chave in chaves:
+        user_data.pop(chave, None)
+
+def nova_sessao_edicao(canal: dict) -> dict:
+    """Estado de user_data['editando'] com todas as chaves fixas já presentes"""
+    return {
+        'canal_id': canal['id'], 'nome': canal['nome'],
+        'ids': canal['ids'].copy(), 'horarios': sorted(canal['horarios']),
+        'changes_made': False, 'etapa': None
+    }
+
+@lru_cache(maxsize=4096)
+def callback_com_id(prefixo: str, valor) -> str:
+    """callback_data '<prefixo><valor>' memorizado e internado, reaproveitado entre renders"""
+    return sys.intern(f"{prefixo}{valor}")